@@ -1,63 +1,332 @@
-from typing import Any, Optional, List
-from datetime import datetime, timedelta
+from typing import Any, Optional, List, NamedTuple, Tuple
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import BaseModel
+from .logger import logger
 import threading
+import asyncio
+import hashlib
+import heapq
+import time
+import json
+import sys
+
+# 各分類的容量上限，max_items: 最大筆數，max_bytes: 近似位元組預算
+# keep_json: 寫入時同時保存 JSON bytes，router 命中快取時可直接回傳，不必重新序列化
+CATEGORY_LIMITS = {
+    "properties": {"max_items": 2000, "max_bytes": 16 * 1024 * 1024, "keep_json": True},
+    "rooms": {"max_items": 10000, "max_bytes": 32 * 1024 * 1024},
+    "leases": {"max_items": 10000, "max_bytes": 32 * 1024 * 1024},
+    "tenants": {"max_items": 10000, "max_bytes": 32 * 1024 * 1024},
+    "users": {"max_items": 5000, "max_bytes": 4 * 1024 * 1024},
+}
+DEFAULT_LIMITS = {"max_items": 1000, "max_bytes": 8 * 1024 * 1024}
+
+# 負向快取：記錄「確定不存在」的 id，TTL 要短，避免新建立的物件被擋太久
+NEGATIVE_TTL = 60
+NEGATIVE_MAX_ITEMS = 10000
+
+# estimate_size 對 model 的抽樣間隔
+SIZE_SAMPLE_INTERVAL = 64
+_model_sizes = {}
+
+
+def serialize(value: Any) -> Optional[bytes]:
+    """將快取值序列化為 JSON bytes，供 L2 快取使用；無法序列化時返回 None"""
+    if hasattr(value, 'model_dump_json'):
+        return value.model_dump_json().encode()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str).encode()
+    return None
+
+
+def estimate_size(value: Any) -> int:
+    """
+    估算快取值的大小（位元組），只用於容量預算，不需精確。已有序列化後的 bytes 時應直接使用其長度。
+    model 不逐筆序列化，每個 class 每 SIZE_SAMPLE_INTERVAL 筆抽樣一次 model_dump_json，以平均值估算
+    """
+    if isinstance(value, BaseModel):
+        stats = _model_sizes.get(type(value))
+        if stats is None:
+            stats = _model_sizes.setdefault(type(value), [0, 0, 0])
+        # [呼叫次數, 抽樣數, 抽樣大小總和]，多執行緒下計數不精確也無妨
+        stats[0] += 1
+        if stats[1] == 0 or stats[0] % SIZE_SAMPLE_INTERVAL == 0:
+            stats[2] += len(value.model_dump_json())
+            stats[1] += 1
+        return stats[2] // stats[1]
+    if isinstance(value, (dict, list)):
+        return len(json.dumps(value, default=str))
+    return sys.getsizeof(value)
+
+
+def version_token(value: Any, update_time: Optional[float], data: Optional[bytes] = None) -> Optional[str]:
+    """
+    快取值的版本識別，用於 HTTP ETag：有 Firestore update_time 時由其產生，
+    否則 (例如尚未寫入 Firestore 的延後寫入) 使用內容雜湊；非 model 的值返回 None
+
+    Args:
+        data: 已序列化的 JSON bytes，有的話直接用於雜湊
+    """
+    if update_time is not None:
+        return f"t{round(update_time * 1_000_000):x}"
+    if hasattr(value, 'model_dump_json'):
+        if data is None:
+            data = value.model_dump_json().encode()
+        return "h" + hashlib.blake2b(data, digest_size=12).hexdigest()
+    return None
+
+
+class CacheEntry(NamedTuple):
+    """不可變的快取項目，set 時整筆替換，因此讀取端不需要加鎖"""
+    value: Any
+    expires_at: float
+    size: int
+    # 超過 stale_at (soft TTL) 仍可回傳，但應在背景重新整理；expires_at 為 hard TTL
+    stale_at: float
+    # Firestore 文件的 update_time (epoch 秒)，用於快照還原時的新鮮度檢查
+    update_time: Optional[float] = None
+    # 版本識別 (version_token)，set 時計算
+    version: Optional[str] = None
+    # 序列化後的 JSON bytes，只有 keep_json 的分類才保存，與 value 一起替換或刪除
+    data: Optional[bytes] = None
+
 
 class Cache:
-    def __init__(self):
-        self._cache = {}
+    def __init__(self, max_items: Optional[int] = None, max_bytes: Optional[int] = None, keep_json: bool = False):
+        # OrderedDict 依存取順序排列，最前面的是最久未使用 (LRU)
+        self._cache = OrderedDict()
+        # 只保護寫入與 LRU 順序，讀取不經過這把鎖
+        self._lock = threading.Lock()
         self._default_ttl = 3600
+        self._max_items = max_items
+        self._max_bytes = max_bytes
+        self.keep_json = keep_json
+        self._size_bytes = 0
+        self._evictions = 0
+        self._expirations = 0
+        # 讀取不加鎖，命中計數在多執行緒下可能少算，只作為指標參考
+        self._hits = 0
+        self._misses = 0
+        # 過期索引: (expires_at, key) 的 min-heap，重新 set 留下的舊紀錄在彈出時略過
+        self._expiry_heap = []
 
     def get(self, key: str) -> Optional[Any]:
-        if key in self._cache:
-            item = self._cache[key]
-            if item['expires_at'] > datetime.now():
-                return item['value']
-            else:
-                del self._cache[key]
-        return None
-
-        
-    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
-        expires_at = datetime.now() + timedelta(seconds=ttl or self._default_ttl)
-        self._cache[key] = {
-            'value': value,
-            'expires_at': expires_at
-        }
+        entry = self.get_entry(key)
+        return entry.value if entry is not None else None
+
+    def peek(self, key: str) -> Optional[CacheEntry]:
+        """不計入命中率也不更新 LRU 的讀取，供已經取得值之後查詢項目資訊使用"""
+        entry = self._cache.get(key)
+        if entry is None or entry.expires_at <= time.monotonic():
+            return None
+        return entry
+
+    def get_entry(self, key: str) -> Optional[CacheEntry]:
+        entry = self._cache.get(key)
+        if entry is None or entry.expires_at <= time.monotonic():
+            # 過期項目交給 cleanup_expired 回收
+            self._misses += 1
+            return None
+        self._hits += 1
+        # 更新 LRU 順序是盡力而為，鎖被佔用時直接略過，不讓讀取等待寫入
+        if self._lock.acquire(blocking=False):
+            try:
+                if self._cache.get(key) is entry:
+                    self._cache.move_to_end(key)
+            finally:
+                self._lock.release()
+        return entry
+
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, soft_ttl: Optional[int] = None,
+            data: Optional[bytes] = None, update_time: Optional[float] = None) -> None:
+        '''
+        Args:
+            data: 呼叫者已序列化的 JSON bytes (例如寫入 L2 時)，用於估算大小與 keep_json，避免重複序列化
+        '''
+        self.set_many([(key, value, ttl, soft_ttl, data, update_time)])
+
+    def set_many(self, items: List[Tuple[str, Any, Optional[int], Optional[int], Optional[bytes], Optional[float]]]) -> None:
+        '''
+        批次寫入，整批只取得一次鎖，淘汰也在全部寫入後只做一次
+        Args:
+            items: (key, value, ttl, soft_ttl, data, update_time) 列表，參數意義同 set
+        '''
+        now = time.monotonic()
+        entries = []
+        for key, value, ttl, soft_ttl, data, update_time in items:
+            expires_at = now + (ttl or self._default_ttl)
+            stale_at = min(now + soft_ttl, expires_at) if soft_ttl else expires_at
+            entry = self._make_entry(value, expires_at, stale_at, data, update_time)
+            entries.append((key, entry))
+        with self._lock:
+            for key, entry in entries:
+                self._delete(key)
+                if self._max_bytes is not None and entry.size > self._max_bytes:
+                    # 單筆就超過預算，直接不快取
+                    self._evictions += 1
+                    continue
+                self._cache[key] = entry
+                self._size_bytes += entry.size
+                heapq.heappush(self._expiry_heap, (entry.expires_at, key))
+            if len(self._expiry_heap) > 2 * len(self._cache) + 64:
+                self._rebuild_expiry_heap()
+            self._evict()
+
+    def patch(self, key: str, value: Any, data: Optional[bytes] = None,
+              update_time: Optional[float] = None) -> Optional[float]:
+        '''
+        原地更新既有項目的值，保留原本的過期時間與 LRU 位置
+        Returns:
+            剩餘的存活秒數，項目不存在或已過期時返回 None
+        '''
+        patched = self._make_entry(value, 0, 0, data, update_time)
+        with self._lock:
+            entry = self._cache.get(key)
+            remaining = entry.expires_at - time.monotonic() if entry is not None else 0
+            if remaining <= 0:
+                return None
+            self._cache[key] = patched._replace(expires_at=entry.expires_at, stale_at=entry.stale_at)
+            self._size_bytes += patched.size - entry.size
+            self._evict()
+            return remaining
+
+    def _make_entry(self, value: Any, expires_at: float, stale_at: float,
+                    data: Optional[bytes], update_time: Optional[float]) -> CacheEntry:
+        if data is None and self.keep_json:
+            data = serialize(value)
+        size = len(data) if data is not None else estimate_size(value)
+        version = version_token(value, update_time, data)
+        return CacheEntry(value, expires_at, size, stale_at, update_time, version,
+                          data if self.keep_json else None)
 
     def delete(self, key: str) -> None:
-        self._cache.pop(key, None)
+        with self._lock:
+            self._delete(key)
 
     def clear(self) -> None:
-        self._cache.clear()
+        with self._lock:
+            self._cache.clear()
+            self._expiry_heap.clear()
+            self._size_bytes = 0
+
+    def set_limits(self, max_items: Optional[int], max_bytes: Optional[int]) -> None:
+        with self._lock:
+            self._max_items = max_items
+            self._max_bytes = max_bytes
+            self._evict()
+
+    def entries(self, limit: Optional[int] = None) -> List[Tuple[str, CacheEntry]]:
+        """返回未過期的項目，最近使用的在前，最多 limit 筆"""
+        now = time.monotonic()
+        with self._lock:
+            items = list(self._cache.items())
+        result = []
+        for key, entry in reversed(items):
+            if limit is not None and len(result) >= limit:
+                break
+            if entry.expires_at > now:
+                result.append((key, entry))
+        return result
+
+    def _delete(self, key: str) -> None:
+        entry = self._cache.pop(key, None)
+        if entry is not None:
+            self._size_bytes -= entry.size
+
+    def _rebuild_expiry_heap(self) -> None:
+        """丟棄已失效的過期紀錄，避免 heap 無限制成長"""
+        self._expiry_heap = [(entry.expires_at, key) for key, entry in self._cache.items()]
+        heapq.heapify(self._expiry_heap)
+
+    def _evict(self) -> None:
+        """超過筆數或位元組上限時，從最久未使用的項目開始淘汰"""
+        while self._cache and (
+            (self._max_items is not None and len(self._cache) > self._max_items)
+            or (self._max_bytes is not None and self._size_bytes > self._max_bytes)
+        ):
+            _, entry = self._cache.popitem(last=False)
+            self._size_bytes -= entry.size
+            self._evictions += 1
 
     # 添加一些有用的管理方法
     def get_cache_stats(self) -> dict:
-        total_items = len(self._cache)
-        expired_items = sum(
-            1 for item in self._cache.values() 
-            if item['expires_at'] <= datetime.now()
-        )
+        '''
+        O(1) 統計，expired_items 為累計已回收的過期項目數
+        '''
         return {
-            'total_items': total_items,
-            'active_items': total_items - expired_items,
-            'expired_items': expired_items
+            'total_items': len(self._cache),
+            'hits': self._hits,
+            'misses': self._misses,
+            'expired_items': self._expirations,
+            'evictions': self._evictions,
+            'size_bytes': self._size_bytes,
+            'max_items': self._max_items,
+            'max_bytes': self._max_bytes
         }
 
-    def cleanup_expired(self) -> int:
-        """清理過期項目並返回清理的數量"""
-        now = datetime.now()
-        expired_keys = [
-            key for key, item in self._cache.items()
-            if item['expires_at'] <= now
-        ]
-        for key in expired_keys:
-            del self._cache[key]
-        return len(expired_keys)
+    def cleanup_expired(self, limit: Optional[int] = None) -> int:
+        """依過期索引清理過期項目並返回清理的數量，limit 限制單次最多清理幾筆"""
+        now = time.monotonic()
+        cleaned = 0
+        with self._lock:
+            heap = self._expiry_heap
+            while heap and heap[0][0] <= now and (limit is None or cleaned < limit):
+                expires_at, key = heapq.heappop(heap)
+                entry = self._cache.get(key)
+                if entry is None or entry.expires_at != expires_at:
+                    continue
+                self._delete(key)
+                self._expirations += 1
+                cleaned += 1
+        return cleaned
+
+class AdaptiveTTL:
+    '''
+    依文件 update_time 的變動頻率估算 TTL：
+
+        平均變動間隔 = (現在 - 第一次觀察到的 update_time) / 觀察到的版本數
+        TTL = factor * 平均變動間隔，並限制在 [min_ttl, max_ttl]
+
+    很少變動的文件 TTL 會逐漸拉長，頻繁變動的文件則縮短
+    '''
+
+    def __init__(self, factor: float = 0.5, history: int = 8, max_keys: int = 50000):
+        self._factor = factor
+        self._history_size = history
+        self._max_keys = max_keys
+        # (category, key) -> 最近幾個不同的 update_time (epoch 秒)
+        self._history = OrderedDict()
+        self._lock = threading.Lock()
+
+    def observe(self, category: str, key: str, update_time: float) -> None:
+        with self._lock:
+            history = self._history.get((category, key))
+            if history is None:
+                history = deque(maxlen=self._history_size)
+                self._history[(category, key)] = history
+                if len(self._history) > self._max_keys:
+                    self._history.popitem(last=False)
+            else:
+                self._history.move_to_end((category, key))
+            if not history or history[-1] != update_time:
+                history.append(update_time)
+
+    def ttl_for(self, category: str, key: str, min_ttl: int, max_ttl: int) -> int:
+        with self._lock:
+            history = self._history.get((category, key))
+            if not history:
+                return min_ttl
+            first, versions = history[0], len(history)
+        interval = max(time.time() - first, 0) / versions
+        return int(min(max(self._factor * interval, min_ttl), max_ttl))
+
 
 class CacheHandler:
     _instance = None
     _lock = threading.Lock()
-    
+
     def __new__(cls):
         with cls._lock:
             if cls._instance is None:
@@ -70,45 +339,344 @@ class CacheHandler:
         # 確保初始化只執行一次
         if not self._initialized:
             self._category = {}
+            self._negative = {}
+            self._negative_hits = {}
+            # 跨 worker 共用的 L2 快取，見 attach_shared()
+            self._shared = None
+            # L2 寫入在單一背景執行緒依序執行，不阻塞 event loop
+            self._shared_writer: Optional[ThreadPoolExecutor] = None
+            # 尚未寫入 L2 的 (category, key) 與整個分類的清除 -> 排隊中的數量，期間 get_shared 不讀取
+            self._shared_dirty = {}
+            self._shared_dirty_categories = {}
+            self._shared_lock = threading.Lock()
+            self._limits = {category: dict(limits) for category, limits in CATEGORY_LIMITS.items()}
+            # 只在建立分類與調整設定時使用，各分類的讀寫由 Cache 自己的鎖負責
             self._lock = threading.Lock()
             self._default_ttl = 3600  # 預設過期時間（秒）
+            self._adaptive = AdaptiveTTL()
             self._initialized = True
 
-    def get(self, category:str,key: str) -> Optional[Any]:
+    def _get_cache(self, category: str, create: bool = False) -> Optional[Cache]:
+        cache = self._category.get(category)
+        if cache is None and create:
+            with self._lock:
+                cache = self._category.get(category)
+                if cache is None:
+                    limits = self._limits.get(category, DEFAULT_LIMITS)
+                    cache = Cache(**limits)
+                    self._category[category] = cache
+        return cache
+
+    def configure(self, category: str, max_items: Optional[int] = None, max_bytes: Optional[int] = None,
+                  keep_json: Optional[bool] = None) -> None:
+        '''
+        設定單一分類的容量上限，已存在的分類會立即套用並淘汰超出的項目
+
+        Args:
+            category: 快取分類
+            max_items: 最大筆數
+            max_bytes: 近似位元組預算
+            keep_json: 是否保存 JSON bytes，只影響之後寫入的項目
+        '''
         with self._lock:
-            if category in self._category:
-                cache = self._category[category]
-                return cache.get(key)
-                
+            limits = self._limits.setdefault(category, dict(DEFAULT_LIMITS))
+            if max_items is not None:
+                limits['max_items'] = max_items
+            if max_bytes is not None:
+                limits['max_bytes'] = max_bytes
+            if keep_json is not None:
+                limits['keep_json'] = keep_json
+            cache = self._category.get(category)
+        if cache is not None:
+            cache.set_limits(limits['max_items'], limits['max_bytes'])
+            cache.keep_json = limits.get('keep_json', False)
+
+    def attach_shared(self, shared: Any) -> None:
+        '''
+        啟用 L2 快取，之後的 set/delete/clear 會在背景執行緒寫入
+
+        Args:
+            shared: SharedCache 實例
+        '''
+        self._shared = shared
+        if self._shared_writer is None:
+            self._shared_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="l2-cache")
+
+    def close_shared(self) -> None:
+        '''
+        等待排隊中的 L2 寫入完成並停止背景執行緒，只供關機流程使用 (會阻塞)
+        '''
+        writer, self._shared_writer = self._shared_writer, None
+        if writer is not None:
+            writer.shutdown(wait=True)
+
+    def get_shared(self, category: str, key: str) -> Optional[Tuple[bytes, Optional[float], float]]:
+        '''
+        讀取 L2 快取中序列化後的資料、update_time 與過期時間 (epoch 秒)，由呼叫端還原成 model 後
+        以 set(..., shared=False) 放回 L1，TTL 不可超過 L2 項目剩餘的時間。
+        還有寫入排隊中的 key 視為未命中，避免讀回已被取代或刪除的資料
+        '''
+        if self._shared is None:
             return None
-        
-    def set(self, category: str, key: str, value: Any) -> None:
-        with self._lock:
-            if category not in self._category:
-                self._category[category] = Cache()
-            self._category[category].set(key, value)
+        if self._shared_dirty_categories.get(category) or self._shared_dirty.get((category, key)):
+            return None
+        return self._shared.get(category, key)
 
+    def _write_shared(self, category: str, keys: Optional[List[str]], write: Any, *args: Any) -> None:
+        '''
+        把 L2 寫入交給背景執行緒，依呼叫順序執行
 
-    def delete(self, category: str ,key: str) -> None:
-        with self._lock:
-            self._category[category].delete(key)
+        Args:
+            keys: 受影響的 key，None 表示整個分類
+            write: SharedCache 的方法
+        '''
+        with self._shared_lock:
+            if keys is None:
+                self._shared_dirty_categories[category] = self._shared_dirty_categories.get(category, 0) + 1
+            else:
+                for key in keys:
+                    self._shared_dirty[(category, key)] = self._shared_dirty.get((category, key), 0) + 1
+
+        def run() -> None:
+            try:
+                write(*args)
+            except Exception as e:
+                logger.error(f"CacheHandler L2 write error: {str(e)}")
+            finally:
+                with self._shared_lock:
+                    if keys is None:
+                        _release(self._shared_dirty_categories, category)
+                    else:
+                        for key in keys:
+                            _release(self._shared_dirty, (category, key))
+
+        writer = self._shared_writer
+        if writer is None:
+            run()
+            return
+        try:
+            writer.submit(run)
+        except RuntimeError:
+            # 關機流程中 executor 已停止，直接寫入
+            run()
+
+    def categories(self) -> List[str]:
+        return list(self._category)
+
+    def get(self, category:str,key: str) -> Optional[Any]:
+        return self._get_cache(category, create=True).get(key)
 
-    def clear(self, category: str) -> None:
+    def get_entry(self, category: str, key: str) -> Optional[CacheEntry]:
+        cache = self._get_cache(category)
+        return cache.get_entry(key) if cache is not None else None
+
+    def peek(self, category: str, key: str) -> Optional[CacheEntry]:
+        cache = self._get_cache(category)
+        return cache.peek(key) if cache is not None else None
+
+    def get_with_state(self, category: str, key: str) -> Tuple[Optional[Any], bool]:
+        '''
+        取得快取值與是否已超過 soft TTL (stale)
+
+        Returns:
+            (value, is_stale)，不存在或已超過 hard TTL 時為 (None, False)
+        '''
+        entry = self._get_cache(category, create=True).get_entry(key)
+        if entry is None:
+            return None, False
+        return entry.value, entry.stale_at <= time.monotonic()
+
+    def set(self, category: str, key: str, value: Any, ttl: Optional[int] = None,
+            soft_ttl: Optional[int] = None, shared: bool = True,
+            update_time: Optional[float] = None) -> None:
+        '''
+        寫入快取，啟用 L2 時由背景執行緒寫入序列化後的 bytes
+
+        Args:
+            ttl: 過期時間（秒），預設 _default_ttl
+            soft_ttl: 超過後視為 stale 的時間（秒）
+            shared: 是否寫入 L2，從 L2 讀回的資料不需要再寫一次
+            update_time: Firestore 文件的 update_time (epoch 秒)
+        '''
+        ttl = ttl or self._default_ttl
+        data = None
+        if shared and self._shared is not None:
+            data = serialize(value)
+            if data is not None:
+                self._write_shared(category, [key], self._shared.set, category, key, data, ttl, update_time)
+        self._get_cache(category, create=True).set(
+            key, value, ttl=ttl, soft_ttl=soft_ttl, data=data, update_time=update_time
+        )
+
+    def set_many(self, category: str, items: List[Tuple[str, Any, Optional[int], Optional[float]]],
+                 soft_ttl: Optional[int] = None, shared: bool = True) -> None:
+        '''
+        批次寫入同一分類，L1 只取得一次鎖，L2 在同一個 transaction 內寫入
+
+        Args:
+            items: (key, value, ttl, update_time) 列表，ttl 為 None 時使用 _default_ttl
+            soft_ttl: 超過後視為 stale 的時間（秒）
+            shared: 是否寫入 L2
+        '''
+        entries = []
+        rows = []
+        for key, value, ttl, update_time in items:
+            ttl = ttl or self._default_ttl
+            data = None
+            if shared and self._shared is not None:
+                data = serialize(value)
+                if data is not None:
+                    rows.append((key, data, ttl, update_time))
+            entries.append((key, value, ttl, soft_ttl, data, update_time))
+        if rows:
+            self._write_shared(category, [row[0] for row in rows], self._shared.set_many, category, rows)
+        self._get_cache(category, create=True).set_many(entries)
+
+    def patch(self, category: str, key: str, value: Any, update_time: Optional[float] = None) -> bool:
+        '''
+        以部分更新後的值取代既有快取項目，TTL 與 soft TTL 維持原本的設定，L2 以剩餘時間寫入
+
+        Returns:
+            是否有更新，項目不在 L1 時返回 False，由呼叫者決定是否改用 set
+        '''
+        cache = self._get_cache(category)
+        if cache is None:
+            return False
+        data = serialize(value) if self._shared is not None or cache.keep_json else None
+        remaining = cache.patch(key, value, data=data, update_time=update_time)
+        if remaining is None:
+            return False
+        if self._shared is not None and data is not None:
+            self._write_shared(category, [key], self._shared.set, category, key, data,
+                               max(int(remaining), 1), update_time)
+        return True
+
+    def adaptive_ttl(self, category: str, key: str, update_time: Optional[float],
+                     min_ttl: int, max_ttl: int) -> int:
+        '''
+        記錄文件的 update_time 並依變動頻率返回 TTL
+
+        Args:
+            category: 快取分類
+            key: 物件id
+            update_time: Firestore 文件的 update_time (epoch 秒)
+            min_ttl: TTL 下限
+            max_ttl: TTL 上限
+        '''
+        if update_time is not None:
+            self._adaptive.observe(category, key, update_time)
+        return self._adaptive.ttl_for(category, key, min_ttl, max_ttl)
+
+
+    def delete(self, category: str ,key: str, shared: bool = True) -> None:
+        cache = self._get_cache(category)
+        if cache is not None:
+            cache.delete(key)
+        if shared and self._shared is not None:
+            self._write_shared(category, [key], self._shared.delete, category, key)
+
+    def clear(self, category: str, shared: bool = True) -> None:
+        cache = self._get_cache(category)
+        if cache is not None:
+            cache.clear()
+        if shared and self._shared is not None:
+            self._write_shared(category, None, self._shared.clear, category)
+
+
+    def mark_missing(self, category: str, key: str, ttl: Optional[int] = None) -> None:
+        '''
+        記錄 Firestore 中不存在的 id，TTL 內的查詢直接視為不存在
+
+        Args:
+            category: 快取分類
+            key: 不存在的物件id
+            ttl: 負向快取秒數，預設 NEGATIVE_TTL
+        '''
+        cache = self._negative.get(category)
+        if cache is None:
+            with self._lock:
+                cache = self._negative.setdefault(category, Cache(max_items=NEGATIVE_MAX_ITEMS))
+        cache.set(key, True, ttl=ttl or NEGATIVE_TTL)
+
+    def is_missing(self, category: str, key: str) -> bool:
+        cache = self._negative.get(category)
+        if cache is None or cache.get(key) is None:
+            return False
         with self._lock:
-            self._category[category].clear()
+            self._negative_hits[category] = self._negative_hits.get(category, 0) + 1
+        return True
+
+    def clear_missing(self, category: str, key: str) -> None:
+        cache = self._negative.get(category)
+        if cache is not None:
+            cache.delete(key)
+
+    def export_category(self, category: str, limit: Optional[int] = None) -> List[Tuple[str, CacheEntry]]:
+        '''
+        匯出分類中未過期的項目，最近使用的在前，供快照使用
 
+        Args:
+            category: 快取分類
+            limit: 最多匯出幾筆
+        '''
+        cache = self._get_cache(category)
+        if cache is None:
+            return []
+        return cache.entries(limit)
 
     # 添加一些有用的管理方法
     def get_cache_stats_category(self, category: str) -> Optional[dict]:
-        with self._lock:
-            if category in self._category:
-                return self._category[category].get_cache_stats()
+        cache = self._get_cache(category)
+        negative = self._negative.get(category)
+        if cache is None and negative is None:
             return None
+        stats = cache.get_cache_stats() if cache is not None else {}
+        stats['negative_items'] = negative.get_cache_stats()['total_items'] if negative is not None else 0
+        stats['negative_hits'] = self._negative_hits.get(category, 0)
+        return stats
 
-    def cleanup_expired(self) -> dict:  # 改變返回型別
-        """清理過期項目並返回每個category的清理數量"""
+    def cleanup_expired(self, limit: Optional[int] = None) -> dict:  # 改變返回型別
+        """清理過期項目並返回每個category的清理數量，limit 為每個category單次上限"""
         cleanup_results = {}
-        with self._lock:
-            for category, cache in self._category.items():
-                cleanup_results[category] = cache.cleanup_expired()
-        return cleanup_results
\ No newline at end of file
+        for category, cache in list(self._category.items()):
+            cleanup_results[category] = cache.cleanup_expired(limit)
+        for category, cache in list(self._negative.items()):
+            cleanup_results[f"{category}:missing"] = cache.cleanup_expired(limit)
+        if self._shared is not None:
+            # 已過期的列不會被讀取，不需要標記，也不等待結果
+            self._write_shared('', [], self._cleanup_shared, limit or 500)
+        return cleanup_results
+
+    def _cleanup_shared(self, limit: int) -> None:
+        # 在 L2 寫入執行緒中分批清理，直到沒有過期項目
+        while self._shared is not None and self._shared.cleanup_expired(limit) >= limit:
+            pass
+
+
+def _release(counts: dict, key: Any) -> None:
+    remaining = counts.get(key, 0) - 1
+    if remaining > 0:
+        counts[key] = remaining
+    else:
+        counts.pop(key, None)
+
+
+async def run_expiry_sweeper(interval: float, batch_size: int) -> None:
+    '''
+    背景清理過期快取，每批最多清理 batch_size 筆後讓出 event loop
+
+    Args:
+        interval: 兩輪清理之間的間隔（秒）
+        batch_size: 每個分類單批清理上限
+    '''
+    handler = CacheHandler()
+    while True:
+        try:
+            while True:
+                results = handler.cleanup_expired(batch_size)
+                if all(count < batch_size for count in results.values()):
+                    break
+                await asyncio.sleep(0)
+        except Exception as e:
+            logger.error(f"run_expiry_sweeper error: {str(e)}")
+        await asyncio.sleep(interval)
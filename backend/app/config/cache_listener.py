@@ -0,0 +1,63 @@
+from typing import Any, Dict, List, Optional
+from .logger import logger
+import threading
+
+
+class CacheInvalidationListener:
+    '''
+    訂閱 Firestore collection 的變更，將其他 instance 或 stds_database 腳本的寫入同步到快取
+
+    只會更新已在快取中的物件，被刪除的物件直接移除；未快取的物件不處理，避免初次快照塞滿快取。
+    db 只需要提供 collection(name).on_snapshot(callback)，因此可接 Firestore emulator
+    (設定 FIRESTORE_EMULATOR_HOST) 或記憶體中的 fake client 測試。
+    '''
+
+    def __init__(self, db: Any, handlers: List[Any]):
+        '''
+        Args:
+            db: Firestore client
+            handlers: 需要同步的 handler，需提供 collection_name 與 apply_remote_change()
+        '''
+        self.db = db
+        self.handlers = {handler.collection_name: handler for handler in handlers}
+        self._watches = []
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            for collection_name in self.handlers:
+                watch = self.db.collection(collection_name).on_snapshot(
+                    self._make_callback(collection_name)
+                )
+                self._watches.append(watch)
+                logger.info(f"CacheInvalidationListener subscribed to {collection_name}")
+
+    def stop(self) -> None:
+        with self._lock:
+            for watch in self._watches:
+                watch.unsubscribe()
+            self._watches.clear()
+
+    def _make_callback(self, collection_name: str):
+        def callback(col_snapshot, changes, read_time):
+            self.apply_changes(collection_name, changes)
+        return callback
+
+    def apply_changes(self, collection_name: str, changes: List[Any]) -> None:
+        '''
+        套用一批變更，on_snapshot 會在 Firestore 的背景執行緒呼叫
+
+        Args:
+            collection_name: 發生變更的 collection
+            changes: DocumentChange 列表，type.name 為 ADDED / MODIFIED / REMOVED
+        '''
+        handler = self.handlers.get(collection_name)
+        if handler is None:
+            return
+        for change in changes:
+            doc = change.document
+            try:
+                data: Optional[Dict] = None if change.type.name == "REMOVED" else doc.to_dict()
+                handler.apply_remote_change(doc.id, data, getattr(doc, 'update_time', None))
+            except Exception as e:
+                logger.error(f"CacheInvalidationListener.apply_changes error: {collection_name}/{doc.id} {str(e)}")
@@ -0,0 +1,90 @@
+from typing import Any, Dict, List
+from .cache import CacheHandler, serialize
+from .logger import logger
+import json
+import os
+
+# 每次 get_all 取回的文件數上限
+FRESHNESS_BATCH_SIZE = 300
+
+
+def save_snapshot(path: str, cache: CacheHandler, categories: List[str], max_items: int) -> int:
+    '''
+    將熱門分類寫成快照檔 (JSON lines)，每個分類最多 max_items 筆，最近使用的優先
+
+    Args:
+        path: 快照檔路徑
+        cache: CacheHandler
+        categories: 要保存的分類
+        max_items: 每個分類上限
+
+    Returns:
+        寫入的數量
+    '''
+    count = 0
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for category in categories:
+            for key, entry in cache.export_category(category, max_items):
+                data = entry.data if entry.data is not None else serialize(entry.value)
+                # 沒有 update_time 的項目無法在啟動時驗證新鮮度，不保存
+                if data is None or entry.update_time is None:
+                    continue
+                f.write(json.dumps({
+                    'c': category,
+                    'k': key,
+                    'u': entry.update_time,
+                    'v': data.decode()
+                }, ensure_ascii=False))
+                f.write('\n')
+                count += 1
+    # 先寫暫存檔再取代，避免關機中斷留下不完整的快照
+    os.replace(tmp_path, path)
+    return count
+
+
+def load_snapshot(path: str, db: Any, handlers: Dict[str, Any]) -> int:
+    '''
+    讀取快照並放回快取，只還原 update_time 與 Firestore 目前一致的文件
+
+    Args:
+        path: 快照檔路徑
+        db: Firestore client
+        handlers: 分類 -> handler，需提供 collection_name 與 restore_cached()
+
+    Returns:
+        還原的數量
+    '''
+    if not os.path.exists(path):
+        return 0
+
+    records: Dict[str, List[dict]] = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('c') in handlers:
+                records.setdefault(record['c'], []).append(record)
+
+    restored = 0
+    for category, items in records.items():
+        handler = handlers[category]
+        collection = db.collection(handler.collection_name)
+        for start in range(0, len(items), FRESHNESS_BATCH_SIZE):
+            batch = {record['k']: record for record in items[start:start + FRESHNESS_BATCH_SIZE]}
+            refs = [collection.document(key) for key in batch]
+            # field_paths=[] 只取回文件的 metadata，不讀取內容
+            for doc in db.get_all(refs, field_paths=[]):
+                record = batch.get(doc.id)
+                if record is None or not doc.exists or doc.update_time is None:
+                    continue
+                if doc.update_time.timestamp() != record['u']:
+                    continue
+                try:
+                    handler.restore_cached(doc.id, record['v'].encode(), record['u'])
+                    restored += 1
+                except Exception as e:
+                    logger.error(f"load_snapshot error: {category}/{doc.id} {str(e)}")
+    return restored
@@ -0,0 +1,211 @@
+from typing import Any, AsyncIterator, Callable, Iterator, List, Optional
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from .firebase import firebase
+from .metrics import executor_queue_depth, executor_wait_seconds
+import threading
+import asyncio
+import time
+
+# ExecutorDatastore.stream 每次在 worker thread 中取出的文件數
+STREAM_CHUNK_SIZE = 100
+# Firestore 單一 WriteBatch 的操作上限
+BATCH_WRITE_LIMIT = 500
+
+
+class Datastore(ABC):
+    '''
+    Firestore 存取層，handler 只透過這裡發出 Firestore RPC
+
+    collection() 返回底層 client 的 collection reference，query 的組法 (where / order_by / limit ...)
+    在同步與非同步 client 上相同；實際送出 RPC 的方法都是 coroutine，不會阻塞 event loop
+    '''
+
+    @abstractmethod
+    def collection(self, name: str) -> Any:
+        pass
+
+    @abstractmethod
+    async def get(self, doc_ref: Any) -> Any:
+        pass
+
+    @abstractmethod
+    async def get_all(self, doc_refs: List[Any], field_paths: Optional[List[str]] = None) -> List[Any]:
+        pass
+
+    @abstractmethod
+    def stream(self, query: Any) -> AsyncIterator[Any]:
+        pass
+
+    @abstractmethod
+    async def set(self, doc_ref: Any, data: dict) -> Any:
+        pass
+
+    @abstractmethod
+    async def update(self, doc_ref: Any, data: dict, last_update_time: Any = None) -> Any:
+        '''
+        只寫入 data 中的欄位，文件不存在時拋出 NotFound
+
+        Args:
+            last_update_time: 文件目前的 update_time (datetime)，不符時拋出 FailedPrecondition
+        '''
+        pass
+
+    @abstractmethod
+    async def delete(self, doc_ref: Any) -> None:
+        pass
+
+    def _precondition(self, last_update_time: Any) -> Any:
+        if last_update_time is None:
+            return None
+        return self.client.write_option(last_update_time=last_update_time)
+
+    def batch(self) -> Any:
+        '''返回底層 client 的 WriteBatch，加入操作不會發出 RPC，最多 BATCH_WRITE_LIMIT 個操作'''
+        return self.client.batch()
+
+    @abstractmethod
+    async def commit(self, batch: Any) -> List[Any]:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class AsyncDatastore(Datastore):
+    '''使用 google-cloud-firestore 的 AsyncClient'''
+
+    def __init__(self, client: Any):
+        self.client = client
+
+    def collection(self, name: str) -> Any:
+        return self.client.collection(name)
+
+    async def get(self, doc_ref: Any) -> Any:
+        return await doc_ref.get()
+
+    async def get_all(self, doc_refs: List[Any], field_paths: Optional[List[str]] = None) -> List[Any]:
+        return [doc async for doc in self.client.get_all(doc_refs, field_paths=field_paths)]
+
+    async def stream(self, query: Any) -> AsyncIterator[Any]:
+        async for doc in query.stream():
+            yield doc
+
+    async def set(self, doc_ref: Any, data: dict) -> Any:
+        return await doc_ref.set(data)
+
+    async def update(self, doc_ref: Any, data: dict, last_update_time: Any = None) -> Any:
+        return await doc_ref.update(data, option=self._precondition(last_update_time))
+
+    async def delete(self, doc_ref: Any) -> None:
+        await doc_ref.delete()
+
+    async def commit(self, batch: Any) -> List[Any]:
+        return await batch.commit()
+
+
+class ExecutorDatastore(Datastore):
+    '''
+    使用同步 client，每個阻塞的 RPC 交給固定大小的 ThreadPoolExecutor 執行，讀寫分開兩個 pool，
+    避免大量寫入佔滿 worker 時影響讀取；排隊數與等待時間記錄在 metrics
+    '''
+
+    def __init__(self, client: Any, read_workers: int, write_workers: int):
+        '''
+        Args:
+            client: google-cloud-firestore 同步 Client
+            read_workers: 讀取 pool 的 thread 數
+            write_workers: 寫入 pool 的 thread 數
+        '''
+        self.client = client
+        self._read_pool = ThreadPoolExecutor(read_workers, thread_name_prefix="firestore-read")
+        self._write_pool = ThreadPoolExecutor(write_workers, thread_name_prefix="firestore-write")
+
+    async def _run(self, pool_name: str, pool: ThreadPoolExecutor, fn: Callable, *args: Any) -> Any:
+        submitted = time.perf_counter()
+        executor_queue_depth.inc(pool_name)
+        lock = threading.Lock()
+        dequeued = []
+
+        def dequeue() -> None:
+            # 開始執行或取消時各呼叫一次，只扣除一次排隊數
+            with lock:
+                if not dequeued:
+                    dequeued.append(True)
+                    executor_queue_depth.dec(pool_name)
+
+        def task() -> Any:
+            dequeue()
+            executor_wait_seconds.observe(time.perf_counter() - submitted, pool_name)
+            return fn(*args)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, task)
+        finally:
+            dequeue()
+
+    async def _read(self, fn: Callable, *args: Any) -> Any:
+        return await self._run("read", self._read_pool, fn, *args)
+
+    async def _write(self, fn: Callable, *args: Any) -> Any:
+        return await self._run("write", self._write_pool, fn, *args)
+
+    def collection(self, name: str) -> Any:
+        return self.client.collection(name)
+
+    async def get(self, doc_ref: Any) -> Any:
+        return await self._read(doc_ref.get)
+
+    async def get_all(self, doc_refs: List[Any], field_paths: Optional[List[str]] = None) -> List[Any]:
+        return await self._read(lambda: list(self.client.get_all(doc_refs, field_paths=field_paths)))
+
+    async def stream(self, query: Any) -> AsyncIterator[Any]:
+        iterator: Iterator[Any] = await self._read(lambda: iter(query.stream()))
+
+        def take() -> List[Any]:
+            chunk = []
+            for doc in iterator:
+                chunk.append(doc)
+                if len(chunk) >= STREAM_CHUNK_SIZE:
+                    break
+            return chunk
+
+        while True:
+            chunk = await self._read(take)
+            if not chunk:
+                break
+            for doc in chunk:
+                yield doc
+
+    async def set(self, doc_ref: Any, data: dict) -> Any:
+        return await self._write(doc_ref.set, data)
+
+    async def update(self, doc_ref: Any, data: dict, last_update_time: Any = None) -> Any:
+        option = self._precondition(last_update_time)
+        return await self._write(lambda: doc_ref.update(data, option=option))
+
+    async def delete(self, doc_ref: Any) -> None:
+        await self._write(doc_ref.delete)
+
+    async def commit(self, batch: Any) -> List[Any]:
+        return await self._write(batch.commit)
+
+    def close(self) -> None:
+        self._read_pool.shutdown(wait=True)
+        self._write_pool.shutdown(wait=True)
+
+
+_datastore: Optional[Datastore] = None
+
+
+def set_datastore(datastore: Datastore) -> None:
+    '''在 app 啟動時選擇 Firestore 存取方式'''
+    global _datastore
+    _datastore = datastore
+
+
+def get_datastore() -> Datastore:
+    global _datastore
+    if _datastore is None:
+        _datastore = AsyncDatastore(firebase.async_db)
+    return _datastore
@@ -1,5 +1,5 @@
 import firebase_admin
-from firebase_admin import  credentials, firestore
+from firebase_admin import  credentials, firestore, firestore_async
 from fastapi.security import HTTPBearer
 
 class FirebaseClient:
@@ -12,6 +12,8 @@ class FirebaseClient:
             firebase_admin.initialize_app(cred)
 
             self.db = firestore.client()
+            # 請求路徑使用非同步 client，避免 RPC 阻塞 event loop
+            self.async_db = firestore_async.client()
         
     @classmethod
     def get_instance(cls):
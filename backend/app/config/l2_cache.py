@@ -0,0 +1,123 @@
+from typing import List, Optional, Tuple
+from .logger import logger
+import threading
+import sqlite3
+import time
+
+
+class SharedCache:
+    '''
+    同一台主機上所有 worker 共用的第二層 (L2) 快取
+
+    以 SQLite 檔案儲存序列化後的 bytes，worker 重啟後資料仍在。
+    過期時間使用 time.time()，因為 monotonic 時鐘無法跨行程比較。
+    '''
+
+    def __init__(self, path: str, default_ttl: int = 3600):
+        '''
+        Args:
+            path: SQLite 檔案路徑，建議放在 tmpfs，例如 /dev/shm/stds_cache.sqlite3
+            default_ttl: 預設過期時間（秒）
+        '''
+        self._path = path
+        self._default_ttl = default_ttl
+        # sqlite3 connection 不能跨執行緒共用，每個執行緒各自建立
+        self._local = threading.local()
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " category TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value BLOB NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " update_time REAL,"
+            " PRIMARY KEY (category, key)"
+            ") WITHOUT ROWID"
+        )
+        self._connection().execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=5, isolation_level=None, check_same_thread=False)
+            # WAL 讓多個 worker 可以同時讀取，寫入不會擋住讀取
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, category: str, key: str) -> Optional[Tuple[bytes, Optional[float], float]]:
+        '''
+        Returns:
+            (序列化後的資料, Firestore update_time, 過期時間 (epoch 秒))，不存在或已過期時返回 None
+        '''
+        try:
+            row = self._connection().execute(
+                "SELECT value, update_time, expires_at FROM cache WHERE category = ? AND key = ? AND expires_at > ?",
+                (category, key, time.time())
+            ).fetchone()
+            return (row[0], row[1], row[2]) if row else None
+        except sqlite3.Error as e:
+            logger.error(f"SharedCache.get error: {str(e)}")
+            return None
+
+    def set(self, category: str, key: str, value: bytes, ttl: Optional[int] = None,
+            update_time: Optional[float] = None) -> None:
+        try:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO cache (category, key, value, expires_at, update_time) VALUES (?, ?, ?, ?, ?)",
+                (category, key, value, time.time() + (ttl or self._default_ttl), update_time)
+            )
+        except sqlite3.Error as e:
+            logger.error(f"SharedCache.set error: {str(e)}")
+
+    def set_many(self, category: str, items: List[Tuple[str, bytes, Optional[int], Optional[float]]]) -> None:
+        '''
+        在同一個 transaction 內寫入多筆，只 fsync 一次
+        Args:
+            items: (key, value, ttl, update_time) 列表
+        '''
+        now = time.time()
+        rows = [
+            (category, key, value, now + (ttl or self._default_ttl), update_time)
+            for key, value, ttl, update_time in items
+        ]
+        conn = self._connection()
+        try:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT OR REPLACE INTO cache (category, key, value, expires_at, update_time) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            logger.error(f"SharedCache.set_many error: {str(e)}")
+
+    def delete(self, category: str, key: str) -> None:
+        try:
+            self._connection().execute(
+                "DELETE FROM cache WHERE category = ? AND key = ?", (category, key)
+            )
+        except sqlite3.Error as e:
+            logger.error(f"SharedCache.delete error: {str(e)}")
+
+    def clear(self, category: str) -> None:
+        try:
+            self._connection().execute("DELETE FROM cache WHERE category = ?", (category,))
+        except sqlite3.Error as e:
+            logger.error(f"SharedCache.clear error: {str(e)}")
+
+    def cleanup_expired(self, limit: int = 500) -> int:
+        """清理過期項目並返回清理的數量，單次最多 limit 筆"""
+        try:
+            cursor = self._connection().execute(
+                "DELETE FROM cache WHERE (category, key) IN ("
+                " SELECT category, key FROM cache WHERE expires_at <= ? LIMIT ?"
+                ")",
+                (time.time(), limit)
+            )
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            logger.error(f"SharedCache.cleanup_expired error: {str(e)}")
+            return 0
@@ -0,0 +1,185 @@
+from typing import Dict, List, Sequence, Tuple
+from contextlib import contextmanager
+from .cache import CacheHandler
+import threading
+import time
+
+# Firestore 讀取延遲的 histogram 區間（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Gauge:
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Gauge):
+    '''只會增加的計數，輸出時的 TYPE 為 counter'''
+    metric_type = "counter"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        raise ValueError("counters can only increase")
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [各區間計數..., +Inf 計數, 總和]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = [0] * (len(self.buckets) + 2)
+                self._values[labels] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = [(labels, list(series)) for labels, series in self._values.items()]
+        for labels, series in values:
+            for bound, count in zip(self.buckets, series):
+                label_str = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{label_str} {_format_value(count)}")
+            label_str = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{label_str} {_format_value(series[-2])}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_count{label_str} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_sum{label_str} {_format_value(series[-1])}")
+        return lines
+
+
+firestore_fetch_seconds = Histogram(
+    "stds_firestore_fetch_seconds",
+    "Latency of Firestore reads issued by handlers",
+    ("collection", "operation")
+)
+
+executor_queue_depth = Gauge(
+    "stds_firestore_executor_queue_depth",
+    "Blocking Firestore calls waiting for a worker thread",
+    ("pool",)
+)
+executor_wait_seconds = Histogram(
+    "stds_firestore_executor_wait_seconds",
+    "Time blocking Firestore calls waited for a worker thread",
+    ("pool",)
+)
+
+write_behind_collapsed_total = Counter(
+    "stds_write_behind_collapsed_total",
+    "Buffered writes replaced by a newer write to the same document before flushing",
+    ("category",)
+)
+write_behind_flushed_total = Counter(
+    "stds_write_behind_flushed_total",
+    "Buffered writes committed to Firestore",
+    ("category",)
+)
+write_behind_dropped_total = Counter(
+    "stds_write_behind_dropped_total",
+    "Buffered writes dropped because Firestore can never accept them",
+    ("category",)
+)
+write_behind_pending = Gauge(
+    "stds_write_behind_pending",
+    "Buffered writes not yet committed to Firestore",
+    ("category",)
+)
+
+# 快取統計 (CacheHandler.get_cache_stats_category) 對應的 Prometheus counter 名稱
+_CACHE_COUNTERS = (
+    ("hits", "stds_cache_hits_total", "Cache lookups that returned an entry"),
+    ("misses", "stds_cache_misses_total", "Cache lookups that found no live entry"),
+    ("evictions", "stds_cache_evictions_total", "Entries evicted by the size limits"),
+    ("expired_items", "stds_cache_expirations_total", "Expired entries reclaimed"),
+    ("negative_hits", "stds_cache_negative_hits_total", "Lookups answered by the negative cache"),
+)
+_CACHE_GAUGES = (
+    ("total_items", "stds_cache_items", "Entries currently cached"),
+    ("size_bytes", "stds_cache_size_bytes", "Approximate bytes currently cached"),
+)
+
+
+def _render_cache_stats() -> List[str]:
+    cache = CacheHandler()
+    stats = {category: cache.get_cache_stats_category(category) or {} for category in cache.categories()}
+    lines = []
+    for groups, metric_type in ((_CACHE_COUNTERS, "counter"), (_CACHE_GAUGES, "gauge")):
+        for key, name, documentation in groups:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for category, values in stats.items():
+                if key in values:
+                    lines.append(f'{name}{{category="{_escape(category)}"}} {_format_value(values[key])}')
+    return lines
+
+
+def render_metrics() -> str:
+    '''
+    以 Prometheus text format (0.0.4) 輸出所有指標
+    '''
+    lines = _render_cache_stats()
+    lines.extend(firestore_fetch_seconds.render())
+    lines.extend(executor_queue_depth.render())
+    lines.extend(executor_wait_seconds.render())
+    lines.extend(write_behind_collapsed_total.render())
+    lines.extend(write_behind_flushed_total.render())
+    lines.extend(write_behind_dropped_total.render())
+    lines.extend(write_behind_pending.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,39 @@
+import os
+'''
+執行期設定，皆可由環境變數覆寫
+'''
+
+# 快取過期清理：每隔幾秒執行一次，每個分類每批最多清理幾筆
+CACHE_SWEEP_INTERVAL = float(os.getenv("CACHE_SWEEP_INTERVAL", "30"))
+CACHE_SWEEP_BATCH = int(os.getenv("CACHE_SWEEP_BATCH", "500"))
+
+# 訂閱 Firestore 變更並同步快取，啟用後可放心調高各分類的 TTL
+CACHE_LISTENER_ENABLED = os.getenv("CACHE_LISTENER_ENABLED", "false").lower() == "true"
+
+# 跨 worker 共用的 L2 快取 (SQLite 檔案)，空字串表示停用；建議放在 tmpfs，例如 /dev/shm/stds_cache.sqlite3
+L2_CACHE_PATH = os.getenv("L2_CACHE_PATH", "")
+
+# 快取快照：關機時寫入、啟動時還原，空字串表示停用
+CACHE_SNAPSHOT_PATH = os.getenv("CACHE_SNAPSHOT_PATH", "")
+CACHE_SNAPSHOT_CATEGORIES = [
+    category for category in os.getenv("CACHE_SNAPSHOT_CATEGORIES", "properties,rooms,leases,tenants,users").split(",")
+    if category
+]
+CACHE_SNAPSHOT_MAX_ITEMS = int(os.getenv("CACHE_SNAPSHOT_MAX_ITEMS", "5000"))
+# 啟動時在 app 開始接受請求前預先載入 properties 與 users
+CACHE_PRELOAD = os.getenv("CACHE_PRELOAD", "false").lower() == "true"
+
+# Firestore 存取方式：async 使用非同步 client；executor 使用同步 client 並交給讀寫分開的 thread pool
+FIRESTORE_MODE = os.getenv("FIRESTORE_MODE", "async")
+FIRESTORE_READ_WORKERS = int(os.getenv("FIRESTORE_READ_WORKERS", "16"))
+FIRESTORE_WRITE_WORKERS = int(os.getenv("FIRESTORE_WRITE_WORKERS", "4"))
+
+# 延後寫入 (write-behind) 的分類，例如 "leases,rooms"；空字串表示全部直接寫入 Firestore
+# 快取立即更新，同一文件在 WRITE_BEHIND_WINDOW 秒內的多次寫入只會 commit 最後一次
+WRITE_BEHIND_CATEGORIES = [
+    category for category in os.getenv("WRITE_BEHIND_CATEGORIES", "").split(",") if category
+]
+WRITE_BEHIND_WINDOW = float(os.getenv("WRITE_BEHIND_WINDOW", "1"))
+
+# 帶有目前 schema 版本標記的 Firestore 文件略過 pydantic 驗證直接建立 model，false 時一律完整驗證
+TRUSTED_HYDRATION = os.getenv("TRUSTED_HYDRATION", "true").lower() == "true"
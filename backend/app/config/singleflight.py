@@ -0,0 +1,58 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable
+import asyncio
+
+
+class _LeaderCancelled(Exception):
+    '''實際執行的呼叫者被取消，等待者沒有被取消，改由等待者重新執行'''
+
+
+class SingleFlight:
+    '''
+    合併同一個 key 的並行請求：第一個呼叫者實際執行，
+    其餘呼叫者等待並共用同一份結果或例外；執行者被取消時由等待者重新執行
+    '''
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        '''
+        執行 fn，若同一個 key 已有進行中的請求則直接等待其結果
+
+        Args:
+            key: 請求識別，例如 (category, item_id)
+            fn: 實際讀取資料的 coroutine function
+        '''
+        future = self._flights.get(key)
+        while future is not None:
+            try:
+                # shield 避免其中一個等待者被取消時連帶取消共用的 future
+                return await asyncio.shield(future)
+            except _LeaderCancelled:
+                # 第一個恢復的等待者成為新的執行者，其餘的等待它
+                future = self._flights.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._flights[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # 沒有其他等待者時避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._flights.pop(key, None)
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+
+single_flight = SingleFlight()
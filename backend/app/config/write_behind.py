@@ -0,0 +1,177 @@
+from typing import Dict, List, Optional, Tuple
+from google.api_core.exceptions import InvalidArgument, PermissionDenied
+from google.cloud.firestore_v1 import _helpers
+from .cache import CacheHandler
+from .datastore import get_datastore, BATCH_WRITE_LIMIT
+from .metrics import (
+    write_behind_collapsed_total, write_behind_dropped_total, write_behind_flushed_total, write_behind_pending
+)
+from .logger import logger
+import asyncio
+
+# 重試也不會成功的錯誤：文件無法編碼、Firestore 拒絕內容或沒有權限
+PERMANENT_ERRORS = (TypeError, ValueError, InvalidArgument, PermissionDenied)
+
+
+class WriteBehindBuffer:
+    '''
+    延後寫入 Firestore 的緩衝區
+
+    handler 先更新快取再把完整文件放進緩衝區，同一文件在 flush 之前的多次寫入只保留最後一次，
+    flush 時切成 WriteBatch 並行 commit，每個 batch 各自建立與 commit。暫時性的失敗放回緩衝區
+    等下一輪重試 (若期間已有更新的寫入則以新的為準)；不可能成功的寫入直接丟棄，記錄錯誤並移除快取，
+    之後的讀取改由 Firestore 取得實際的資料
+    '''
+
+    def __init__(self):
+        # (collection, item_id) -> (category, 文件內容)
+        self._pending: Dict[Tuple[str, str], Tuple[str, dict]] = {}
+        # 正在 commit 的文件，讀取時仍視為尚未寫入 Firestore
+        self._flushing: Dict[Tuple[str, str], Tuple[str, dict]] = {}
+        self._inflight: Optional[asyncio.Task] = None
+
+    def enqueue(self, category: str, collection_name: str, item_id: str, data: dict) -> None:
+        '''
+        Args:
+            category: 快取分類，用於 metrics
+            collection_name: Firestore collection
+            item_id: 文件id
+            data: 完整文件內容，commit 時以 set 覆寫
+
+        Raises:
+            TypeError / ValueError: 文件含有 Firestore 無法儲存的值，與直接寫入時一樣在請求中失敗
+        '''
+        # WriteBatch.set 也是在這一步編碼，先檢查才不會在背景 flush 時才發現
+        _helpers.encode_dict(data)
+        key = (collection_name, item_id)
+        if key in self._pending:
+            write_behind_collapsed_total.inc(category)
+        else:
+            write_behind_pending.inc(category)
+        self._pending[key] = (category, data)
+
+    def pending(self, collection_name: str, item_id: str) -> Optional[dict]:
+        '''返回尚未 commit 的最新文件內容，沒有時返回 None'''
+        key = (collection_name, item_id)
+        entry = self._pending.get(key) or self._flushing.get(key)
+        return entry[1] if entry is not None else None
+
+    async def discard(self, collection_name: str, item_ids: List[str]) -> None:
+        '''
+        丟棄尚未 commit 的寫入並等待進行中的 flush 完成，
+        之後對同一文件的直接寫入或刪除不會被緩衝區的舊資料覆蓋
+        '''
+        # 先等進行中的 flush 結束，commit 失敗放回緩衝區的寫入也一併丟棄
+        while self._inflight is not None:
+            await asyncio.shield(self._inflight)
+        for item_id in item_ids:
+            entry = self._pending.pop((collection_name, item_id), None)
+            if entry is not None:
+                write_behind_pending.dec(entry[0])
+
+    async def flush(self) -> int:
+        '''
+        commit 目前緩衝的所有寫入，同時只會有一輪 flush 在進行
+
+        Returns:
+            成功 commit 的文件數
+        '''
+        while self._inflight is not None:
+            await asyncio.shield(self._inflight)
+        if not self._pending:
+            return 0
+        self._inflight = asyncio.ensure_future(self._commit_pending())
+        # shield: flusher 在關機時被取消也不會中斷 commit，失敗的寫入仍能放回緩衝區
+        return await asyncio.shield(self._inflight)
+
+    async def _commit_pending(self) -> int:
+        self._flushing, self._pending = self._pending, {}
+        entries = list(self._flushing.items())
+        chunks = [entries[i:i + BATCH_WRITE_LIMIT] for i in range(0, len(entries), BATCH_WRITE_LIMIT)]
+        try:
+            outcomes = await asyncio.gather(*(self._commit_chunk(chunk) for chunk in chunks), return_exceptions=True)
+        finally:
+            self._flushing = {}
+            self._inflight = None
+        flushed = 0
+        for chunk, outcome in zip(chunks, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error(f"WriteBehindBuffer.flush error: {str(outcome)}")
+                self._requeue(chunk)
+                continue
+            flushed += outcome
+        return flushed
+
+    async def _commit_chunk(self, chunk: List[Tuple[Tuple[str, str], Tuple[str, dict]]]) -> int:
+        '''
+        建立並 commit 一個 batch，無法編碼的文件個別丟棄，不影響同一批的其他文件
+
+        Returns:
+            成功 commit 的文件數
+        '''
+        store = get_datastore()
+        batch = store.batch()
+        written = []
+        for key, entry in chunk:
+            collection_name, item_id = key
+            try:
+                batch.set(store.collection(collection_name).document(item_id), entry[1])
+            except PERMANENT_ERRORS as e:
+                self._drop(key, entry, e)
+                continue
+            written.append((key, entry))
+        if not written:
+            return 0
+        try:
+            await store.commit(batch)
+        except PERMANENT_ERRORS as e:
+            for key, entry in written:
+                self._drop(key, entry, e)
+            return 0
+        except Exception as e:
+            logger.error(f"WriteBehindBuffer.flush error: {str(e)}")
+            self._requeue(written)
+            return 0
+        for _, (category, _) in written:
+            write_behind_pending.dec(category)
+            write_behind_flushed_total.inc(category)
+        return len(written)
+
+    def _drop(self, key: Tuple[str, str], entry: Tuple[str, dict], error: Exception) -> None:
+        collection_name, item_id = key
+        category = entry[0]
+        logger.error(f"WriteBehindBuffer dropped write {collection_name}/{item_id}: {str(error)}")
+        write_behind_pending.dec(category)
+        write_behind_dropped_total.inc(category)
+        if key not in self._pending:
+            # 快取中是沒有寫入成功的資料
+            CacheHandler().delete(category, item_id)
+
+    def _requeue(self, entries: List[Tuple[Tuple[str, str], Tuple[str, dict]]]) -> None:
+        for key, entry in entries:
+            if key in self._pending:
+                # flush 期間已有更新的寫入，以新的為準
+                write_behind_pending.dec(entry[0])
+            else:
+                self._pending[key] = entry
+
+    def size(self) -> int:
+        return len(self._pending)
+
+
+write_behind = WriteBehindBuffer()
+
+
+async def run_write_behind_flusher(interval: float) -> None:
+    '''
+    背景定期 flush 延後寫入，關機時由 lifespan 取消後再做最後一次 flush
+
+    Args:
+        interval: 兩次 flush 之間的間隔（秒），即同一文件寫入合併的時間窗
+    '''
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await write_behind.flush()
+        except Exception as e:
+            logger.error(f"run_write_behind_flusher error: {str(e)}")
@@ -1,9 +1,10 @@
 from fastapi import APIRouter,HTTPException,Depends,Response,status
 from ..dependency.dependencies import get_app_settings
-from ..models.Property import PropertyHandler, Property
+from ..models.Property import Property
 from ..models.Tenant import TenantHandler, Tenant
 from ..models.Leases import LeasesHandler, Lease
 from ..models.Room import RoomHandler, Room
+from ..config.cache import CacheHandler
 from firebase_admin import auth
 import requests 
 import json
@@ -40,8 +41,8 @@ async def check_cache_status(setting = Depends(get_app_settings)):
         raise HTTPException(status_code=404)
     
     try:
-        handler = PropertyHandler('test')
-        return await handler.get_cache_status()
+        cache = CacheHandler()
+        return {category: cache.get_cache_stats_category(category) for category in cache.categories()}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"dev_test error : {str(e)}")
 
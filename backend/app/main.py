@@ -1,21 +1,122 @@
 from fastapi import FastAPI
+from contextlib import asynccontextmanager, suppress
 from .config.firebase import firebase
+from .config.datastore import AsyncDatastore, ExecutorDatastore, get_datastore, set_datastore
+from .config.cache import CacheHandler, run_expiry_sweeper
+from .config.l2_cache import SharedCache
+from .config.cache_listener import CacheInvalidationListener
+from .config.cache_snapshot import save_snapshot, load_snapshot
+from .config.write_behind import write_behind, run_write_behind_flusher
+from .config.logger import logger
+from .config import settings
 from .development import development
 from .properties_management import properties
+from .monitoring import metrics
+from .models.Property import PropertyHandler
+from .models.Room import RoomHandler
+from .models.Leases import LeasesHandler
+from .models.Tenant import TenantHandler
+from .models.Users import UserHandler
+import asyncio
 
+# 背景工作使用的識別，不代表任何實際使用者
+SYSTEM_UID = "system"
 
-app = FastAPI()
-app.debug = True
 
+async def warm_up_cache() -> None:
+    '''
+    啟動時還原快照並視設定預先載入熱門分類，在 app 開始接受請求前完成
+    '''
+    if settings.CACHE_SNAPSHOT_PATH:
+        try:
+            handlers = {
+                "properties": PropertyHandler(SYSTEM_UID),
+                "rooms": RoomHandler(SYSTEM_UID),
+                "leases": LeasesHandler(SYSTEM_UID),
+                "tenants": TenantHandler(SYSTEM_UID),
+                "users": UserHandler(SYSTEM_UID),
+            }
+            restored = load_snapshot(settings.CACHE_SNAPSHOT_PATH, firebase.db, handlers)
+            logger.info(f"cache snapshot restored {restored} items")
+        except Exception as e:
+            logger.error(f"load_snapshot error: {str(e)}")
+    if settings.CACHE_PRELOAD:
+        try:
+            properties_count = await PropertyHandler(SYSTEM_UID).preload()
+            users_count = await UserHandler(SYSTEM_UID).preload()
+            logger.info(f"cache preload properties: {properties_count}, users: {users_count}")
+        except Exception as e:
+            logger.error(f"cache preload error: {str(e)}")
 
-# setting up firebase
-firebase.get_instance()
 
-app.include_router(properties.router)
-app.include_router(development.router)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.L2_CACHE_PATH:
+        CacheHandler().attach_shared(SharedCache(settings.L2_CACHE_PATH))
+    await warm_up_cache()
+    # 背景清理過期快取
+    sweeper = asyncio.create_task(
+        run_expiry_sweeper(settings.CACHE_SWEEP_INTERVAL, settings.CACHE_SWEEP_BATCH)
+    )
+    flusher = None
+    if settings.WRITE_BEHIND_CATEGORIES:
+        flusher = asyncio.create_task(run_write_behind_flusher(settings.WRITE_BEHIND_WINDOW))
+    listener = None
+    if settings.CACHE_LISTENER_ENABLED:
+        listener = CacheInvalidationListener(firebase.db, [
+            PropertyHandler(SYSTEM_UID),
+            RoomHandler(SYSTEM_UID),
+            LeasesHandler(SYSTEM_UID),
+            TenantHandler(SYSTEM_UID),
+        ])
+        listener.start()
+    yield
+    if listener is not None:
+        listener.stop()
+    sweeper.cancel()
+    with suppress(asyncio.CancelledError):
+        await sweeper
+    if flusher is not None:
+        flusher.cancel()
+        with suppress(asyncio.CancelledError):
+            await flusher
+    # 關機前把延後寫入全部 commit，datastore 關閉後就無法再寫入
+    try:
+        flushed = await write_behind.flush()
+        logger.info(f"write-behind flushed {flushed} writes on shutdown")
+        if write_behind.size():
+            logger.error(f"write-behind flush left {write_behind.size()} writes uncommitted")
+    except Exception as e:
+        logger.error(f"write-behind flush error: {str(e)}")
+    get_datastore().close()
+    if settings.CACHE_SNAPSHOT_PATH:
+        try:
+            saved = save_snapshot(
+                settings.CACHE_SNAPSHOT_PATH,
+                CacheHandler(),
+                settings.CACHE_SNAPSHOT_CATEGORIES,
+                settings.CACHE_SNAPSHOT_MAX_ITEMS
+            )
+            logger.info(f"cache snapshot saved {saved} items")
+        except Exception as e:
+            logger.error(f"save_snapshot error: {str(e)}")
+    # 等待排隊中的 L2 寫入完成，其他 worker 才讀得到
+    await asyncio.to_thread(CacheHandler().close_shared)
 
 
+app = FastAPI(lifespan=lifespan)
+app.debug = True
 
 
+# setting up firebase
+firebase.get_instance()
+if settings.FIRESTORE_MODE == "executor":
+    set_datastore(ExecutorDatastore(
+        firebase.db, settings.FIRESTORE_READ_WORKERS, settings.FIRESTORE_WRITE_WORKERS
+    ))
+else:
+    set_datastore(AsyncDatastore(firebase.async_db))
 
-        
+app.include_router(properties.router)
+app.include_router(development.router)
+app.include_router(metrics.router)
@@ -1,23 +1,52 @@
 from fastapi import HTTPException, Response, status
-from ..config.firebase import firebase
-from ..config.cache import CacheHandler
+from ..config.datastore import get_datastore, BATCH_WRITE_LIMIT
+from ..config.cache import CacheHandler, version_token
+from ..config.singleflight import single_flight
+from ..config.write_behind import write_behind
+from ..config import settings
 from ..config.logger import logger
+from ..config.metrics import firestore_fetch_seconds
 from .Users import UserHandler
+from .hydrate import hydrate, mark, to_firestore, SCHEMA_FIELD
 from typing import TypeVar, Generic, Type, Any
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
+from google.api_core.exceptions import FailedPrecondition, NotFound
+from google.cloud.firestore_v1.base_query import FieldFilter
 from abc import ABC
-from typing import Optional, List, Dict
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Tuple, AsyncIterator
 import time , random ,string
+import asyncio
+import base64
+import json
 
 T = TypeVar('T', bound=BaseModel)
 
+# 未啟用變更監聽時，列表快取的秒數
+LIST_CACHE_TTL = 60
+
 class Access(BaseModel):
     type: str = Field(..., pattern="^(internal|external)$")  # 限制只能是 internal 或 external
     companies: List[str]
     allowClients: Optional[str]
 
 
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None  # 沒有下一頁時為 None
+
+
+class BulkWriteResult(BaseModel):
+    id: str
+    ok: bool
+    error: Optional[str] = None  # 寫入失敗時的原因
+
+
 class BaseHandler(Generic[T],ABC):
+    # 背景重新整理中的 (category, item_id)，避免同一物件重複排程
+    _refresh_tasks: Dict[tuple, asyncio.Task] = {}
+
     def __init__(self, uid: str):
         """
         初始化處理器模型
@@ -26,12 +55,27 @@ class BaseHandler(Generic[T],ABC):
             uid: 識別使用者
         """
         self.cache = CacheHandler()
-        self.db = firebase.db
+        self.store = get_datastore()
         self.logging = logger
         self.collection_name: str = ""
         self.cache_category: str = ""
         self.id_prefix: str = ""
         self.model_class: Type[T] = None
+        # 列表用的精簡 model，只包含列表畫面需要的欄位，查詢時以 select 投影
+        self.summary_class: Optional[Type[BaseModel]] = None
+        # 快取過期時間（秒），子類別依資料變動頻率覆寫
+        self.cache_ttl: int = 3600
+        # stale-while-revalidate: 超過 soft_ttl 的快取仍直接回傳並於背景更新，None 表示停用
+        self.soft_ttl: Optional[int] = None
+        # 自適應 TTL 的 (下限, 上限)，依 update_time 的變動頻率在範圍內調整，None 表示固定使用 cache_ttl
+        self.adaptive_ttl: Optional[Tuple[int, int]] = None
+        # 公司列表 (id 清單) 的快取秒數；其他程序新增的物件只有變更監聽會讓列表失效，
+        # 未啟用時只短暫快取，啟用時 (None) 與 cache_ttl 相同
+        self.list_ttl: Optional[int] = None if settings.CACHE_LISTENER_ENABLED else LIST_CACHE_TTL
+        # 部分更新時作為樂觀鎖的版本欄位 (int)，None 表示只依 update_time 檢查
+        self.version_field: Optional[str] = None
+        # 寫入文件的 schema 版本標記，model 欄位或型別改變時遞增，舊文件讀取時會重新完整驗證
+        self.schema_version: int = 1
         self.User = UserHandler(uid)
         self.uid = uid
     async def delete_item(self, item_id: str) -> Response:
@@ -42,18 +86,21 @@ class BaseHandler(Generic[T],ABC):
             item_id:要刪除的物件id 
         '''
         try:
-            doc_ref = self.db.collection(self.collection_name).document(item_id)
-            item = doc_ref.get().to_dict()
+            doc_ref = self.store.collection(self.collection_name).document(item_id)
+            item = write_behind.pending(self.collection_name,item_id)
+            if item is None:
+                item = (await self.store.get(doc_ref)).to_dict()
             if item is None:
                 raise HTTPException(status_code=404, detail=f"{str(item_id)} is not exist")
-            deleted_item = self.model_class(**item)
-            if not self._has_access(deleted_item.access.companies):
+            deleted_item = self._hydrate(self.model_class, item)
+            if not await self._has_access(deleted_item.access.companies):
                 self.logging.info(f"{str(self.uid)}has no access to item :{str(item_id)}")
                 raise HTTPException(status_code=403,detail=f"{str(self.uid)}has no access to item :{str(item_id)}")
             
-            if self.cache.get(self.cache_category,item_id) is not None:
-                self.cache.delete(self.cache_category,item_id)
-            self.db.collection(self.collection_name).document(item_id).delete()
+            await write_behind.discard(self.collection_name,[item_id])
+            self.cache.delete(self.cache_category,item_id)
+            self._invalidate_lists(deleted_item.access.companies)
+            await self.store.delete(doc_ref)
             return Response(status_code=status.HTTP_204_NO_CONTENT)
         except Exception as e:
             self.logging.error(f"{str(self.id_prefix)}_Handler.delete_item error: {str(e)}")
@@ -75,6 +122,147 @@ class BaseHandler(Generic[T],ABC):
         '''
         return await self._save_item(item,"put")
 
+    async def patch_item(self, item_id: str, changes: Dict[str, Any]) -> T:
+        '''
+        部分更新單一物件，只把有變動的欄位以 update() 寫入 Firestore，並以讀取時的 update_time
+        作為前置條件，期間被其他人修改時返回 412。有 version_field 的類別需在 changes 帶入編輯前的版本號，
+        不符時返回 409，成功後版本號加一
+        Args:
+            item_id: 物件id
+            changes: 欄位與新值，巢狀欄位 (例如 access) 整個取代
+        Returns:
+            更新後的物件
+        '''
+        unknown = [field for field in changes if field == "id" or field not in self.model_class.model_fields]
+        if unknown:
+            raise HTTPException(status_code=400,detail=f"fields can not be updated: {', '.join(unknown)}")
+        changes = dict(changes)
+        expected_version = None
+        if self.version_field is not None:
+            expected_version = changes.pop(self.version_field, None)
+            if expected_version is None:
+                raise HTTPException(status_code=400,detail=f"{self.version_field} is required")
+        try:
+            if write_behind.pending(self.collection_name,item_id) is not None:
+                # 先 commit 緩衝中的寫入，前置條件才會對應 Firestore 上的最新版本
+                await write_behind.flush()
+            doc_ref = self.store.collection(self.collection_name).document(item_id)
+            use_cache = True
+            while True:
+                current, last_update_time = await self._load_for_update(doc_ref, use_cache)
+                if not await self._has_access(current.access.companies):
+                    self.logging.info(f"{str(self.uid)}has no access to item :{str(item_id)}")
+                    raise HTTPException(status_code=403,detail=f"{str(self.uid)}has no access to item :{str(item_id)}")
+                old = current.model_dump()
+                patched = self.model_class(**{**old, **changes})
+                fields = {field: value for field, value in patched.model_dump().items() if value != old[field]}
+                try:
+                    if self.version_field is not None:
+                        if old[self.version_field] != expected_version:
+                            raise HTTPException(status_code=409,detail=f"{str(item_id)} version {str(expected_version)} is outdated")
+                        if fields:
+                            fields[self.version_field] = expected_version + 1
+                            patched = patched.model_copy(update={self.version_field: expected_version + 1})
+                    if not fields:
+                        return current
+                    result = await self.store.update(doc_ref, {**to_firestore(fields), SCHEMA_FIELD: self.schema_version}, last_update_time)
+                    break
+                except (HTTPException, FailedPrecondition) as e:
+                    if use_cache:
+                        # 快取可能落後 Firestore，以最新的文件重試一次
+                        use_cache = False
+                        continue
+                    if isinstance(e, HTTPException):
+                        raise
+                    raise HTTPException(status_code=412,detail=f"{str(item_id)} was modified concurrently")
+
+            timestamp = result.update_time.timestamp()
+            if not self.cache.patch(self.cache_category,item_id,patched,timestamp):
+                self._cache_item(patched, result.update_time)
+            if "access" in fields:
+                self._invalidate_lists(list(set(current.access.companies) | set(patched.access.companies)))
+            return patched
+        except HTTPException:
+            raise
+        except ValidationError as e:
+            raise HTTPException(status_code=422,detail=f"{str(self.id_prefix)}_Handler.patch_item invalid changes: {str(e)}")
+        except NotFound:
+            raise HTTPException(status_code=404, detail=f"{str(item_id)} is not exist")
+        except Exception as e:
+            self.logging.error(f"{str(self.id_prefix)}_Handler.patch_item error: {str(e)}")
+            raise HTTPException(status_code=500,detail=f"{str(self.id_prefix)}_Handler.patch_item error: {str(e)}")
+
+    async def _load_for_update(self, doc_ref: Any, use_cache: bool) -> Tuple[T, Any]:
+        '''
+        取得部分更新的基準版本與其 update_time，快取中有 update_time 時不讀取 Firestore
+        '''
+        if use_cache:
+            entry = self.cache.peek(self.cache_category,doc_ref.id)
+            if entry is not None and entry.update_time is not None:
+                return entry.value, datetime.fromtimestamp(entry.update_time, timezone.utc)
+        doc = await self.store.get(doc_ref)
+        if not doc.exists:
+            raise HTTPException(status_code=404, detail=f"{str(doc_ref.id)} is not exist")
+        return self._hydrate(self.model_class, doc.to_dict()), doc.update_time
+
+    async def bulk_save(self, items: List[T], method: str) -> List[BulkWriteResult]:
+        '''
+        批次新增或更新多個物件，整批驗證後切成每批 BATCH_WRITE_LIMIT 個操作的 WriteBatch 並行 commit。
+        每個 batch 是原子的，commit 失敗只影響該 batch 內的物件
+        Args:
+            items: 完整的item類型列表
+            method: "post" 或 "put"，與 _save_item 相同，put 需要對每個物件都有權限
+        Returns:
+            依 items 順序排列的每筆寫入結果
+        '''
+        duplicated = [item_id for item_id, count in Counter(item.id for item in items).items() if count > 1]
+        if duplicated:
+            raise HTTPException(status_code=400,detail=f"duplicated ids: {', '.join(duplicated)}")
+        if method == "put":
+            company = await self.User.get_access()
+            denied = [item.id for item in items if company not in item.access.companies]
+            if denied:
+                self.logging.info(f"{str(self.uid)}has no access to items :{', '.join(denied)}")
+                raise HTTPException(status_code=403,detail=f"{str(self.uid)}has no access to items :{', '.join(denied)}")
+        try:
+            # 直接寫入的資料較新，不可再被緩衝區的舊資料覆蓋
+            await write_behind.discard(self.collection_name,[item.id for item in items])
+            collection = self.store.collection(self.collection_name)
+            chunks = [items[i:i + BATCH_WRITE_LIMIT] for i in range(0, len(items), BATCH_WRITE_LIMIT)]
+            batches = []
+            companies = set()
+            for chunk in chunks:
+                batch = self.store.batch()
+                for item in chunk:
+                    batch.set(collection.document(item.id), mark(to_firestore(item.model_dump()), self.schema_version))
+                    companies.update(item.access.companies)
+                    previous = self.cache.peek(self.cache_category,item.id)
+                    if previous is not None:
+                        companies.update(previous.value.access.companies)
+                batches.append(batch)
+
+            with firestore_fetch_seconds.time(self.collection_name, "bulk_save"):
+                outcomes = await asyncio.gather(
+                    *(self.store.commit(batch) for batch in batches), return_exceptions=True
+                )
+
+            results = []
+            written = []
+            for chunk, outcome in zip(chunks, outcomes):
+                if isinstance(outcome, Exception):
+                    self.logging.error(f"{str(self.id_prefix)}_Handler.bulk_save batch error: {str(outcome)}")
+                    results.extend(BulkWriteResult(id=item.id, ok=False, error=str(outcome)) for item in chunk)
+                    continue
+                for item, write_result in zip(chunk, outcome):
+                    written.append((item, write_result.update_time))
+                    results.append(BulkWriteResult(id=item.id, ok=True))
+            self._cache_items(written)
+            self._invalidate_lists(list(companies))
+            return results
+        except Exception as e:
+            self.logging.error(f"{str(self.id_prefix)}_Handler.bulk_save error: {str(e)}")
+            raise HTTPException(status_code=500,detail=f"{str(self.id_prefix)}_Handler.bulk_save error: {str(e)}")
+
     async def get_item(self, item_id: str) -> Optional[T]:
         '''
         取得單一物件，同時檢查是否有權限取得若無返回None
@@ -82,18 +270,21 @@ class BaseHandler(Generic[T],ABC):
             item_id: 物件id
         '''
         try:
-            cache_data = self.cache.get(self.cache_category,item_id)
+            cache_data, is_stale = self.cache.get_with_state(self.cache_category,item_id)
             if cache_data:
                 item = cache_data
+                if is_stale:
+                    self._schedule_refresh(item_id)
+            elif self.cache.is_missing(self.cache_category,item_id):
+                return None
             else:
-                doc_ref = self.db.collection(self.collection_name).document(item_id)
-                doc = doc_ref.get()
-                if doc: 
-                    item = self.model_class(**doc.to_dict())
-                else:
+                # 同一物件的並行 cache miss 只讀取一次 Firestore
+                item = await single_flight.do(
+                    (self.cache_category, item_id),
+                    lambda: self._load_item(item_id)
+                )
+                if item is None:
                     return None
-                
-                self.cache.set(self.cache_category,item.id,item)
 
             if await self._has_access(item.access.companies):
                 return item
@@ -101,30 +292,426 @@ class BaseHandler(Generic[T],ABC):
                 self.logging.info(f"{str(self.uid)}has no access to item :{str(item_id)}")
                 raise HTTPException(status_code=403,detail=f"{str(self.uid)}has no access to item :{str(item_id)}")
 
+        except HTTPException:
+            raise
         except Exception as e:
             self.logging.error(f"{str(self.id_prefix)}_Handler.get_item error: {str(e)}")
             raise HTTPException(status_code=500,detail=f"{str(self.id_prefix)}_Handler.get_item error: {str(e)}")
+
+    async def get_item_with_version(self, item_id: str) -> Tuple[Optional[T], Optional[str]]:
+        '''
+        取得單一物件與其版本識別 (ETag 用)，權限檢查同 get_item
+        Args:
+            item_id: 物件id
+        Returns:
+            (物件, 版本識別)，物件不存在時為 (None, None)
+        '''
+        item = await self.get_item(item_id)
+        if item is None:
+            return None, None
+        return item, self.version_of(item)
+
+    def version_of(self, item: T) -> Optional[str]:
+        '''
+        物件的版本識別，優先使用快取項目中 set 時算好的值
+        '''
+        entry = self.cache.peek(self.cache_category,item.id)
+        if entry is not None and entry.value is item:
+            return entry.version
+        return version_token(item, None)
+
+    def encode_item(self, item: T) -> bytes:
+        '''
+        物件的 JSON bytes，快取項目仍是同一個物件且有保存 bytes (keep_json) 時直接使用
+        '''
+        entry = self.cache.peek(self.cache_category,item.id)
+        if entry is not None and entry.value is item and entry.data is not None:
+            return entry.data
+        return item.model_dump_json().encode()
+
+    def encode_items(self, items: List[T]) -> bytes:
+        return b"[" + b",".join(self.encode_item(item) for item in items) + b"]"
+
+    async def _load_item(self, item_id: str) -> Optional[T]:
+        '''
+        L1 未命中時的讀取順序：L2 共用快取 -> Firestore
+        Args:
+            item_id: 物件id
+        '''
+        shared = self.cache.get_shared(self.cache_category,item_id)
+        if shared is not None:
+            data, update_time, expires_at = shared
+            return self.restore_cached(item_id, data, update_time, shared=False, expires_at=expires_at)
+        return await self._fetch_item(item_id)
+
+    async def _fetch_item(self, item_id: str) -> Optional[T]:
+        '''
+        從 Firestore 讀取單一物件並寫入快取，不存在時返回None
+        Args:
+            item_id: 物件id
+        '''
+        pending = write_behind.pending(self.collection_name,item_id)
+        if pending is not None:
+            item = self._hydrate(self.model_class, pending)
+            self._cache_item(item)
+            return item
+        with firestore_fetch_seconds.time(self.collection_name, "get_item"):
+            doc = await self.store.get(self.store.collection(self.collection_name).document(item_id))
+        if not doc.exists:
+            # 背景更新時文件可能已被刪除，移除過期的快取才不會繼續回傳舊資料
+            self.cache.delete(self.cache_category,item_id)
+            self.cache.mark_missing(self.cache_category,item_id)
+            return None
+        item = self._hydrate(self.model_class, doc.to_dict())
+        self._cache_item(item, doc.update_time)
+        return item
+
+    def apply_remote_change(self, item_id: str, data: Optional[Dict], update_time: Any = None) -> None:
+        '''
+        套用 Firestore 上的外部變更：已快取的物件以新資料取代，data 為 None 表示已刪除
+        Args:
+            item_id: 物件id
+            data: 變更後的文件內容
+            update_time: 文件的 update_time
+        '''
+        if write_behind.pending(self.collection_name,item_id) is not None:
+            # 本機尚未 commit 的寫入比 Firestore 上的資料新，快取保持不變
+            return
+        if data is None:
+            self.cache.delete(self.cache_category,item_id)
+            # 不知道被刪除的物件屬於哪些公司，清除整個列表快取
+            self.cache.clear(self._list_category,shared=False)
+            return
+        self.cache.clear_missing(self.cache_category,item_id)
+        cached = self.cache.peek(self.cache_category,item_id)
+        companies = set(data.get('access', {}).get('companies', []))
+        if cached is not None:
+            companies.update(cached.value.access.companies)
+        self._invalidate_lists(list(companies))
+        if cached is None:
+            return
+        try:
+            self._cache_item(self._hydrate(self.model_class, data), update_time)
+        except Exception:
+            # 無法驗證的資料不留在快取中，下次讀取時再由 Firestore 取得
+            self.cache.delete(self.cache_category,item_id)
+            raise
+
+    def restore_cached(self, item_id: str, data: bytes, update_time: Optional[float], shared: bool = True,
+                       expires_at: Optional[float] = None) -> T:
+        '''
+        將序列化後的物件 (L2 或快照) 還原成 model 並放回快取
+        Args:
+            item_id: 物件id
+            data: model_dump_json 的結果
+            update_time: 文件的 update_time (epoch 秒)
+            shared: 是否同步寫入 L2
+            expires_at: L2 項目的過期時間 (epoch 秒)，L1 不會存活得比它久
+        '''
+        item = self.model_class.model_validate_json(data)
+        ttl = self._ttl_for(item_id, update_time)
+        if expires_at is not None:
+            # 在 L2 已經存在的時間也要算進 TTL，否則其他 worker 可能提供兩倍 TTL 的舊資料
+            ttl = max(min(ttl, int(expires_at - time.time())), 1)
+        self.cache.set(self.cache_category,item_id,item,ttl=ttl,
+                       soft_ttl=self.soft_ttl,shared=shared,update_time=update_time)
+        return item
+
+    def _cache_item(self, item: T, update_time: Any = None) -> None:
+        '''
+        寫入快取
+        Args:
+            item: 物件
+            update_time: Firestore 回傳的 update_time (datetime)
+        '''
+        timestamp = update_time.timestamp() if update_time is not None else None
+        self.cache.set(self.cache_category,item.id,item,ttl=self._ttl_for(item.id, timestamp),
+                       soft_ttl=self.soft_ttl,update_time=timestamp)
+
+    def _cache_items(self, written: List[Tuple[T, Any]]) -> None:
+        '''
+        批次寫入快取，整批只取得一次快取鎖
+        Args:
+            written: (物件, Firestore 回傳的 update_time) 列表
+        '''
+        entries = []
+        for item, update_time in written:
+            timestamp = update_time.timestamp() if update_time is not None else None
+            self.cache.clear_missing(self.cache_category,item.id)
+            entries.append((item.id, item, self._ttl_for(item.id, timestamp), timestamp))
+        if entries:
+            self.cache.set_many(self.cache_category,entries,soft_ttl=self.soft_ttl)
+
+    def _ttl_for(self, item_id: str, update_time: Optional[float]) -> int:
+        if self.adaptive_ttl is None:
+            return self.cache_ttl
+        min_ttl, max_ttl = self.adaptive_ttl
+        return self.cache.adaptive_ttl(self.cache_category, item_id, update_time, min_ttl, max_ttl)
+
+    async def preload(self) -> int:
+        '''
+        啟動時預先載入整個 collection 到快取，不做權限檢查，只供 app lifespan 使用
+
+        Returns:
+            載入的數量
+        '''
+        fetched = []
+        async for doc in self.store.stream(self.store.collection(self.collection_name)):
+            fetched.append((self._hydrate(self.model_class, doc.to_dict()), doc.update_time))
+        self._cache_items(fetched)
+        return len(fetched)
+
+    def _schedule_refresh(self, item_id: str) -> None:
+        '''
+        在背景重新讀取已過 soft TTL 的物件，同一物件同時只會有一個更新任務
+        Args:
+            item_id: 物件id
+        '''
+        key = (self.cache_category, item_id)
+        if key in BaseHandler._refresh_tasks:
+            return
+        task = asyncio.create_task(single_flight.do(key, lambda: self._fetch_item(item_id)))
+        BaseHandler._refresh_tasks[key] = task
+
+        def _done(task: asyncio.Task) -> None:
+            BaseHandler._refresh_tasks.pop(key, None)
+            if not task.cancelled() and task.exception() is not None:
+                self.logging.error(f"{str(self.id_prefix)}_Handler._schedule_refresh error: {str(task.exception())}")
+
+        task.add_done_callback(_done)
         
 
-    async def get_item_list(self) -> List[Any]:
+    async def get_items(self, item_ids: List[str]) -> List[Optional[T]]:
+        '''
+        批次取得多個物件，快取未命中的部分以一次 get_all 讀取
+        Args:
+            item_ids: 物件id列表
+        Returns:
+            依 item_ids 順序排列的物件，不存在或無權限的位置為 None
+        '''
+        try:
+            company = await self.User.get_access()
+            found: Dict[str, T] = {}
+            misses = []
+            for item_id in dict.fromkeys(item_ids):
+                item = self.cache.get(self.cache_category,item_id)
+                if item is not None:
+                    found[item_id] = item
+                    continue
+                if self.cache.is_missing(self.cache_category,item_id):
+                    continue
+                shared = self.cache.get_shared(self.cache_category,item_id)
+                if shared is not None:
+                    data, update_time, expires_at = shared
+                    found[item_id] = self.restore_cached(item_id, data, update_time, shared=False,
+                                                         expires_at=expires_at)
+                    continue
+                pending = write_behind.pending(self.collection_name,item_id)
+                if pending is not None:
+                    found[item_id] = self._hydrate(self.model_class, pending)
+                    continue
+                misses.append(item_id)
+
+            if misses:
+                collection = self.store.collection(self.collection_name)
+                refs = [collection.document(item_id) for item_id in misses]
+                with firestore_fetch_seconds.time(self.collection_name, "get_items"):
+                    for doc in await self.store.get_all(refs):
+                        if not doc.exists:
+                            self.cache.mark_missing(self.cache_category,doc.id)
+                            continue
+                        item = self._hydrate(self.model_class, doc.to_dict())
+                        self._cache_item(item, doc.update_time)
+                        found[doc.id] = item
+
+            result = []
+            for item_id in item_ids:
+                item = found.get(item_id)
+                if item is not None and company not in item.access.companies:
+                    self.logging.info(f"{str(self.uid)}has no access to item :{str(item_id)}")
+                    item = None
+                result.append(item)
+            return result
+        except HTTPException:
+            raise
+        except Exception as e:
+            self.logging.error(f"{str(self.id_prefix)}_Handler.get_items error: {str(e)}")
+            raise HTTPException(status_code=500,detail=f"{str(self.id_prefix)}_Handler.get_items error: {str(e)}")
+
+    async def get_item_list(self, summary: bool = False) -> List[Any]:
         '''
         返回handler處理類別的List
+        Args:
+            summary: 只讀取 summary_class 的欄位並返回精簡 model
         '''
         try:
-            ##只獲取文檔的參考資訊（ID和路徑），不包含文檔內容
+            company = await self.User.get_access()
+            cached = self._get_cached_list(company)
+            if cached is not None:
+                return [self._to_summary(item) for item in cached] if summary else cached
+
+            # 單一 query 只串流使用者公司可存取的文件，邊接收邊驗證
             result = []
-            docs = self.db.collection(self.cache_category).list_documents()
-            for doc in docs:
-                doc_ref = self.db.collection(self.cache_category).document(doc.id)
-                item = self.model_class(**doc_ref.get().to_dict())
-                self.cache.set(self.cache_category,item.id,item)
-                if item is not None and self._has_access(item.access.companies):
+            fetched = []
+            query = self._project(self._company_query(company), summary)
+            with firestore_fetch_seconds.time(self.collection_name, "get_item_list"):
+                async for doc in self.store.stream(query):
+                    item = self._from_doc(doc, summary)
                     result.append(item)
+                    if not summary:
+                        fetched.append((item, doc.update_time))
+            if not summary:
+                # 整批寫入快取，L2 只需要一個 transaction
+                self._cache_items(fetched)
+                # id 清單只有本機能正確失效，不寫入 L2
+                self.cache.set(self._list_category,company,[item.id for item in result],
+                               ttl=self.list_ttl or self.cache_ttl,shared=False)
             return result
+        except HTTPException:
+            raise
         except Exception as e:
             self.logging.error(f"{str(self.id_prefix)}_Handler.get_item_list error: {str(e)}")
             raise HTTPException(status_code=500,detail=f"{str(self.id_prefix)}_Handler.get_item_list error: {str(e)}")
         
+    async def iter_items(self, summary: bool = False) -> AsyncIterator[Any]:
+        '''
+        返回逐筆產生使用者可存取物件的 async generator，供大量匯出以串流回應使用；
+        不組出完整列表也不寫入快取，記憶體用量與 collection 大小無關。
+        權限在開始串流前檢查，錯誤仍能以一般的 HTTP 狀態碼回應
+        Args:
+            summary: 只讀取 summary_class 的欄位並返回精簡 model
+        '''
+        company = await self.User.get_access()
+        query = self._project(self._company_query(company), summary)
+        model = self.summary_class if summary else self.model_class
+        return self._stream_items(query, model)
+
+    async def _stream_items(self, query: Any, model: Type[BaseModel]) -> AsyncIterator[Any]:
+        try:
+            async for doc in self.store.stream(query):
+                yield self._hydrate(model, doc.to_dict())
+        except Exception as e:
+            # 回應標頭已送出，只能記錄錯誤並中斷串流
+            self.logging.error(f"{str(self.id_prefix)}_Handler.iter_items error: {str(e)}")
+            raise
+
+    async def get_item_page(self, limit: int, cursor: Optional[str] = None, summary: bool = False) -> Page:
+        '''
+        以 cursor 分頁取得handler處理類別，依 id 排序，每頁只讀取 limit 筆文件
+        Args:
+            limit: 每頁筆數
+            cursor: 上一頁返回的 next_cursor，None 表示第一頁
+            summary: 只讀取 summary_class 的欄位並返回精簡 model
+        '''
+        try:
+            last_id = self._decode_cursor(cursor) if cursor else None
+        except Exception:
+            raise HTTPException(status_code=400,detail=f"invalid cursor: {str(cursor)}")
+        try:
+            company = await self.User.get_access()
+            # array_contains + order_by 需要 access.companies / id 的複合索引
+            query = self._company_query(company).order_by("id")
+            if last_id is not None:
+                query = query.start_after({"id": last_id})
+            query = self._project(query.limit(limit), summary)
+
+            items = []
+            fetched = []
+            with firestore_fetch_seconds.time(self.collection_name, "get_item_page"):
+                async for doc in self.store.stream(query):
+                    item = self._from_doc(doc, summary)
+                    items.append(item)
+                    if not summary:
+                        fetched.append((item, doc.update_time))
+            self._cache_items(fetched)
+            next_cursor = self._encode_cursor(items[-1].id) if len(items) == limit else None
+            model = self.summary_class if summary else self.model_class
+            return Page[model](items=items, next_cursor=next_cursor)
+        except HTTPException:
+            raise
+        except Exception as e:
+            self.logging.error(f"{str(self.id_prefix)}_Handler.get_item_page error: {str(e)}")
+            raise HTTPException(status_code=500,detail=f"{str(self.id_prefix)}_Handler.get_item_page error: {str(e)}")
+
+    def _project(self, query: Any, summary: bool) -> Any:
+        '''
+        summary 模式下只向 Firestore 取回 summary_class 的欄位
+        '''
+        if not summary:
+            return query
+        if self.summary_class is None:
+            raise ValueError(f"{str(self.id_prefix)}_Handler has no summary model")
+        return query.select([*self.summary_class.model_fields, SCHEMA_FIELD])
+
+    def _from_doc(self, doc: Any, summary: bool) -> Any:
+        '''
+        由查詢結果建立 model，完整 model 由呼叫者整批寫入快取，投影後的精簡 model 不快取
+        '''
+        model = self.summary_class if summary else self.model_class
+        return self._hydrate(model, doc.to_dict())
+
+    def _hydrate(self, model: Type[BaseModel], data: Dict) -> Any:
+        '''
+        由 Firestore 文件建立 model，帶有目前 schema_version 標記的文件略過驗證
+        '''
+        return hydrate(model, data, self.schema_version if settings.TRUSTED_HYDRATION else None)
+
+    def _to_summary(self, item: T) -> BaseModel:
+        return self.summary_class(**item.model_dump(include=set(self.summary_class.model_fields)))
+
+    def _company_query(self, company: str) -> Any:
+        '''
+        只查詢指定公司可存取的文件，權限過濾在 Firestore 端完成
+        Args:
+            company: 使用者所屬公司
+        '''
+        return self.store.collection(self.collection_name).where(
+            filter=FieldFilter("access.companies", "array_contains", company)
+        )
+
+    @property
+    def _write_behind(self) -> bool:
+        return self.cache_category in settings.WRITE_BEHIND_CATEGORIES
+
+    @property
+    def _list_category(self) -> str:
+        # 每個公司的列表快取：company -> 物件id列表，物件本身仍存放在 cache_category
+        return f"{self.cache_category}:list"
+
+    def _get_cached_list(self, company: str) -> Optional[List[T]]:
+        '''
+        由列表快取組出公司可存取的物件，任一物件已不在快取中或已不屬於該公司即視為未命中
+        Args:
+            company: 使用者所屬公司
+        '''
+        ids = self.cache.get(self._list_category,company)
+        if ids is None:
+            return None
+        items = []
+        for item_id in ids:
+            # 列表本身的查詢已計入命中率，組出物件時不重複計算
+            entry = self.cache.peek(self.cache_category,item_id)
+            if entry is None:
+                return None
+            if company not in entry.value.access.companies:
+                # 背景更新或其他 worker 的寫入改變了權限，列表已過時
+                self.cache.delete(self._list_category,company,shared=False)
+                return None
+            items.append(entry.value)
+        return items
+
+    def _invalidate_lists(self, companies: List[str]) -> None:
+        for company in companies:
+            self.cache.delete(self._list_category,company,shared=False)
+
+    @staticmethod
+    def _encode_cursor(last_id: str) -> str:
+        return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> str:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))["id"]
+
     async def get_cache_status(self) -> dict:
         try:
             return self.cache.get_cache_stats_category(self.cache_category)
@@ -143,10 +730,22 @@ class BaseHandler(Generic[T],ABC):
             item: 完整的item類型
         '''
         try:
-            if method is "post" or (method is "put" and self._has_access(item.access.companies)):
-                data = item.model_dump()
-                self.db.collection(self.collection_name).document(item.id).set(data)
-                self.cache.set(self.cache_category,item.id,item)
+            if method == "post" or (method == "put" and await self._has_access(item.access.companies)):
+                data = mark(to_firestore(item.model_dump()), self.schema_version)
+                previous = self.cache.peek(self.cache_category,item.id)
+                if self._write_behind:
+                    # 快取立即更新，Firestore 由 write_behind 合併後批次寫入
+                    write_behind.enqueue(self.cache_category,self.collection_name,item.id,data)
+                    update_time = None
+                else:
+                    doc_ref = self.store.collection(self.collection_name).document(item.id)
+                    update_time = (await self.store.set(doc_ref, data)).update_time
+                self.cache.clear_missing(self.cache_category,item.id)
+                self._cache_item(item, update_time)
+                companies = set(item.access.companies)
+                if previous is not None:
+                    companies.update(previous.value.access.companies)
+                self._invalidate_lists(list(companies))
 
                 return item
             else:
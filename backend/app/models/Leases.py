@@ -31,12 +31,36 @@ class Lease(BaseModel):
 
 
 
+class LeaseSummary(BaseModel):
+    id : str
+    time_start : date
+    time_end : date
+    status : bool
+    property_id : str
+    tenant_id : str
+    room_id : str
+
+    @field_validator('time_start', 'time_end')
+    def parse_date(cls, value):
+        if isinstance(value, datetime):
+            return value.date()
+        elif isinstance(value, date):
+            return value
+        raise ValueError('Invalid date format')
+
+
 class LeasesHandler(PropertyRelatedHandler):
         
     def __init__(self, uid: str):
             super().__init__(uid)
             self.collection_name = "leases"
             self.model_class = Lease
+            self.summary_class = LeaseSummary
             self.cache_category = "leases"
             self.id_prefix = "LEAS"
+            # 租約經常更新，上限維持短 TTL，只會因頻繁變動而再縮短，不會拉長到提供過期資料
+            self.cache_ttl = 600
+            self.adaptive_ttl = (60, 600)
+            # 部分更新時以 version 做樂觀鎖
+            self.version_field = "version"
 
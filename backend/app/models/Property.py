@@ -1,4 +1,5 @@
 from .Base import BaseHandler, Access
+from ..config import settings
 from pydantic import BaseModel, Field
 from typing import Optional, List 
 
@@ -17,13 +18,30 @@ class Property(BaseModel):
     file: List[str] = []
     access: Access
 
+class PropertySummary(BaseModel):
+    id : str
+    name : str
+    nickname : str
+    address : str
+    phone : str
+
 class PropertyHandler(BaseHandler):
     def __init__(self, uid: str):
         super().__init__(uid)
         self.collection_name = "properties"
         self.model_class = Property
+        self.summary_class = PropertySummary
         self.cache_category = "properties"
         self.id_prefix = "PROP"
+        # 物件資料很少變動，依變動頻率調整 TTL；5 分鐘後於背景更新，避免熱門物件過期時的延遲尖峰
+        # 只有啟用變更監聽 (外部修改會同步到快取) 時才延長到一小時以上
+        if settings.CACHE_LISTENER_ENABLED:
+            self.cache_ttl = 6 * 3600
+            self.adaptive_ttl = (3600, 24 * 3600)
+        else:
+            self.cache_ttl = 3600
+            self.adaptive_ttl = (600, 3600)
+        self.soft_ttl = 300
 
 
 
@@ -1,4 +1,5 @@
 from .Base import PropertyRelatedHandler, Access
+from ..config import settings
 from pydantic import BaseModel, Field, field_validator
 from typing import Optional, List, Dict
 
@@ -16,11 +17,23 @@ class Room(BaseModel):
     access : Access
 
 
+class RoomSummary(BaseModel):
+    id : str
+    name : str
+    storey : float
+    type : str
+    property_id : str
+
+
 class RoomHandler(PropertyRelatedHandler):
 
     def __init__(self, uid: str):
         super().__init__(uid)  
         self.collection_name = "rooms"
         self.model_class = Room
+        self.summary_class = RoomSummary
         self.cache_category = "rooms"
         self.id_prefix = "ROOM"  
+        self.cache_ttl = 3600
+        # 啟用變更監聽時才允許超過一小時
+        self.adaptive_ttl = (600, 6 * 3600) if settings.CACHE_LISTENER_ENABLED else (600, 3600)
@@ -26,13 +26,22 @@ class Tenant(BaseModel):
             return value
         raise ValueError('Invalid date format')
     
+class TenantSummary(BaseModel):
+    id : str
+    name : str
+    tel : str
+    leases_id : str
+
 class TenantHandler(PropertyRelatedHandler):
 
     def __init__(self, uid: str):
         super().__init__(uid)
         self.collection_name = "tenants"
         self.model_class = Tenant
+        self.summary_class = TenantSummary
         self.cache_category = "tenants"
         self.id_prefix = "TENA"
+        self.cache_ttl = 1800
+        self.adaptive_ttl = (300, 3600)
 
 
@@ -1,7 +1,12 @@
 from fastapi import HTTPException
-from ..config.firebase import firebase
+from ..config.datastore import get_datastore
 from ..config.exception import DatabaseError , CacheError
 from ..config.cache import CacheHandler
+from ..config.singleflight import single_flight
+from ..config.metrics import firestore_fetch_seconds
+from typing import Optional
+import json
+import time
 
 class UserHandler:
 
@@ -9,30 +14,65 @@ class UserHandler:
         
         self.uid = uid
         self.cache_catagory = "users"
+        self.collection_name = "user"
+        # 權限資料會變動，快取時間較短
+        self.cache_ttl = 600
         self.cache = CacheHandler()
-        self.db = firebase.db
+        self.store = get_datastore()
         
 
 
     async def _get_user_from_db(self):
-        """快取用戶數據"""
+        """快取用戶數據，同一用戶的並行請求只讀取一次"""
         try:
-            doc_ref = self.db.collection('user').document(self.uid)
-            user_data = doc_ref.get()
-            if user_data:
-                self.cache.set('users',self.uid,user_data.to_dict())
-                return user_data.to_dict()
-            else:
-                raise DatabaseError(f"無法取得使用者:{self.uid}資料")
+            return await single_flight.do(('users', self.uid), self._load_user)
         except Exception as e:
             
             raise CacheError("快取失敗")
 
+    async def _load_user(self):
+        """L1 未命中時先查 L2 共用快取，再讀取 Firestore"""
+        shared = self.cache.get_shared(self.cache_catagory,self.uid)
+        if shared is not None:
+            data, update_time, expires_at = shared
+            return self.restore_cached(self.uid, data, update_time, shared=False, expires_at=expires_at)
+        return await self._fetch_user()
+
+    async def _fetch_user(self):
+        doc_ref = self.store.collection(self.collection_name).document(self.uid)
+        with firestore_fetch_seconds.time(self.collection_name, "get_access"):
+            user_data = await self.store.get(doc_ref)
+        if user_data.exists:
+            self.cache.set(self.cache_catagory,self.uid,user_data.to_dict(),ttl=self.cache_ttl,update_time=user_data.update_time.timestamp())
+            return user_data.to_dict()
+        else:
+            self.cache.mark_missing(self.cache_catagory,self.uid)
+            raise DatabaseError(f"無法取得使用者:{self.uid}資料")
+
+    def restore_cached(self, uid: str, data: bytes, update_time: Optional[float], shared: bool = True,
+                       expires_at: Optional[float] = None) -> dict:
+        """將序列化後的用戶資料 (L2 或快照) 放回快取，expires_at 為 L2 項目的過期時間，L1 不會存活得比它久"""
+        value = json.loads(data)
+        ttl = self.cache_ttl
+        if expires_at is not None:
+            ttl = max(min(ttl, int(expires_at - time.time())), 1)
+        self.cache.set(self.cache_catagory,uid,value,ttl=ttl,shared=shared,update_time=update_time)
+        return value
+
+    async def preload(self) -> int:
+        """啟動時預先載入所有用戶資料，只供 app lifespan 使用"""
+        count = 0
+        async for doc in self.store.stream(self.store.collection(self.collection_name)):
+            self.cache.set(self.cache_catagory,doc.id,doc.to_dict(),ttl=self.cache_ttl,update_time=doc.update_time.timestamp())
+            count += 1
+        return count
+
     async def get_access(self):
         try:
-            if self.cache.get(self.cache_catagory,self.uid):
-                value = self.cache.get(self.cache_catagory,self.uid)
-            else:
+            value = self.cache.get(self.cache_catagory,self.uid)
+            if not value:
+                if self.cache.is_missing(self.cache_catagory,self.uid):
+                    raise DatabaseError(f"無法取得使用者:{self.uid}資料")
                 value = await self._get_user_from_db()
             return value['company']
         except Exception as e:
@@ -0,0 +1,153 @@
+'''
+由 Firestore 文件建立 model
+
+handler 寫入的文件帶有 SCHEMA_FIELD 標記，代表內容是同一個 schema 版本的 model_dump()，
+讀回時不經驗證直接建立 model，只做 Firestore 型別的還原 (datetime -> date、巢狀 model)。
+沒有標記、版本不符或無法還原的文件 (舊資料、在 console 手動修改的文件) 仍走完整驗證。
+
+這個模組只依賴 pydantic，benchmark 可以直接 import
+'''
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple, Type, TypeVar, Union, get_args, get_origin
+from datetime import date, datetime, time, timezone
+from pydantic import BaseModel
+import types
+
+# 文件中記錄 schema 版本的欄位，不屬於任何 model，驗證時會被忽略
+SCHEMA_FIELD = "_schema"
+
+M = TypeVar('M', bound=BaseModel)
+Converter = Callable[[Any], Any]
+
+# model class -> (欄位名稱, 需要轉換的欄位)，None 表示無法安全略過驗證
+_plans: Dict[type, Optional[Tuple[FrozenSet[str], Tuple[Tuple[str, Converter], ...]]]] = {}
+_object_setattr = object.__setattr__
+# X | Y 寫法的 Union (Python 3.10+)，較舊的版本只有 typing.Union
+_UnionType = getattr(types, "UnionType", Union)
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def mark(data: dict, schema_version: int) -> dict:
+    '''在要寫入 Firestore 的文件加上 schema 版本標記'''
+    data[SCHEMA_FIELD] = schema_version
+    return data
+
+
+def to_firestore(value: Any) -> Any:
+    '''
+    把 model_dump() 的值轉成 Firestore 可以儲存的型別，date 轉為當天 00:00 (UTC) 的 datetime，
+    讀回時由 hydrate 或 model 的 validator 還原
+    '''
+    if isinstance(value, dict):
+        return {key: to_firestore(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_firestore(item) for item in value]
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return datetime.combine(value, time.min, tzinfo=timezone.utc)
+    return value
+
+
+def hydrate(model_class: Type[M], data: dict, schema_version: Optional[int]) -> M:
+    '''
+    建立 model，文件的標記與 schema_version 相同時略過驗證
+
+    Args:
+        model_class: 目標 model
+        data: Firestore 文件內容
+        schema_version: 目前的 schema 版本，None 表示一律完整驗證
+    '''
+    if schema_version is not None and data.get(SCHEMA_FIELD) == schema_version:
+        try:
+            return construct(model_class, data)
+        except (_Unsupported, ValueError, TypeError):
+            pass
+    return model_class(**data)
+
+
+def construct(model_class: Type[M], data: dict) -> M:
+    '''
+    不經驗證建立 model，只還原 Firestore 回傳時型別不同的欄位。
+    文件必須剛好包含所有欄位 (model_dump 的結果)，缺少或多出欄位時拋出例外，由呼叫者改為完整驗證
+
+    與 model_construct 相同的做法，但省去預設值與 fields_set 的計算
+    '''
+    plan = _plans.get(model_class, False)
+    if plan is False:
+        plan = _build_plan(model_class)
+        _plans[model_class] = plan
+    if plan is None:
+        raise _Unsupported(model_class.__name__)
+    names, converters = plan
+    values = dict(data)
+    values.pop(SCHEMA_FIELD, None)
+    if values.keys() != names:
+        raise ValueError(f"{model_class.__name__} fields do not match the document")
+    for name, convert in converters:
+        values[name] = convert(values[name])
+    item = model_class.__new__(model_class)
+    _object_setattr(item, '__dict__', values)
+    _object_setattr(item, '__pydantic_fields_set__', set(names))
+    _object_setattr(item, '__pydantic_extra__', None)
+    _object_setattr(item, '__pydantic_private__', None)
+    return item
+
+
+def _build_plan(model_class: Type[BaseModel]) -> Optional[Tuple[FrozenSet[str], Tuple[Tuple[str, Converter], ...]]]:
+    # private attributes 與 extra="allow" 需要 model_construct 的完整處理
+    if model_class.__private_attributes__ or model_class.model_config.get('extra') == 'allow':
+        return None
+    converters = []
+    try:
+        for name, field in model_class.model_fields.items():
+            if field.alias is not None and field.alias != name:
+                raise _Unsupported(name)
+            convert = _converter(field.annotation)
+            if convert is not None:
+                converters.append((name, convert))
+    except _Unsupported:
+        return None
+    return frozenset(model_class.model_fields), tuple(converters)
+
+
+def _converter(annotation: Any) -> Optional[Converter]:
+    '''
+    返回欄位值的轉換函式，不需要轉換時返回 None
+    '''
+    origin = get_origin(annotation)
+    if origin is Union or origin is _UnionType:
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        converters = [_converter(arg) for arg in args]
+        if all(convert is None for convert in converters):
+            return None
+        if len(args) != 1:
+            # 多種型別的 Union 無法判斷該用哪一種還原
+            raise _Unsupported(str(annotation))
+        inner = converters[0]
+        return lambda value: None if value is None else inner(value)
+    if origin in (list, List):
+        args = get_args(annotation)
+        inner = _converter(args[0]) if args else None
+        if inner is None:
+            return None
+        return lambda value: [inner(item) for item in value]
+    if origin is not None:
+        for arg in get_args(annotation):
+            if _converter(arg) is not None:
+                raise _Unsupported(str(annotation))
+        return None
+    if annotation is date:
+        return _to_date
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return lambda value: construct(annotation, value) if isinstance(value, dict) else value
+    return None
+
+
+def _to_date(value: Any) -> date:
+    # Firestore 沒有 date 型別，讀回的是 datetime
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    raise ValueError('Invalid date format')
@@ -0,0 +1,15 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from ..config.metrics import render_metrics
+
+router = APIRouter()
+
+@router.get("/metrics", tags=['monitoring'], response_class=PlainTextResponse)
+async def get_metrics() -> PlainTextResponse:
+    '''
+    Prometheus metrics
+
+    Returns:
+        快取命中/未命中/淘汰/過期計數與 Firestore 讀取延遲，不含任何使用者資料
+    '''
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
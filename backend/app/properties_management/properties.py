@@ -1,32 +1,116 @@
-from fastapi import APIRouter, Depends, HTTPException, Response
-from ..models.Property import PropertyHandler, Property
+from fastapi import APIRouter, Depends, HTTPException, Response, Query, Header
+from fastapi.responses import StreamingResponse
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
+from ..models.Property import PropertyHandler, Property, PropertySummary
+from ..models.Room import RoomHandler, Room
+from ..models.Leases import LeasesHandler, Lease
+from ..models.Base import Page, BulkWriteResult
+from pydantic import BaseModel, Field
 from ..dependency.dependencies import verify_token 
 
 router = APIRouter(prefix="/properties-management")
 
+class BatchGetRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=300)
+
+class RoomBatchWriteRequest(BaseModel):
+    method: str = Field("post", pattern="^(post|put)$")
+    items: List[Room] = Field(..., min_length=1, max_length=5000)
+
 @router.get("/properties",tags=['properties-management'])
 async def get_properties(
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    view: str = Query("full", pattern="^(full|summary)$"),
+    response_format: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
     token = Depends(verify_token)
-) -> list:
+) -> Union[List[Property], Page[Property], List[PropertySummary], Page[PropertySummary]]:
     """
     get  properties list
     
+    Parameters:
+        limit: Page size, returns the whole list when neither limit nor cursor is given
+        cursor: next_cursor returned by the previous page
+        view: "summary" only reads and returns the list columns (PropertySummary)
+        format: "ndjson" streams one property per line while it is read from Firestore
+    
     Returns:
-        Property: The list of properties which user has access to
+        Property: The list of properties which user has access to,
+        or a page with items and next_cursor when paginating
     
     Raises:
-        400: ID mismatch
+        400: ID mismatch / invalid cursor
         404: Property not found
         500: Internal unknown error
     """
 
     property_handler = PropertyHandler(token['uid'])
-    return await property_handler.get_item_list()
+    summary = view == "summary"
+    if response_format == "ndjson":
+        return StreamingResponse(
+            _ndjson(await property_handler.iter_items(summary)),
+            media_type="application/x-ndjson"
+        )
+    if limit is None and cursor is None:
+        items = await property_handler.get_item_list(summary)
+        if summary:
+            return items
+        # 直接使用快取中已序列化的 bytes，不經過 response model 驗證與序列化
+        return Response(content=property_handler.encode_items(items), media_type="application/json")
+    return await property_handler.get_item_page(limit or 50, cursor, summary)
         
     
+async def _ndjson(items) -> AsyncIterator[bytes]:
+    async for item in items:
+        yield item.model_dump_json().encode() + b"\n"
+
+
+def _etag(version: Optional[str]) -> Optional[str]:
+    return f'"{version}"' if version else None
+
+
+def _set_etag(response: Response, version: Optional[str]) -> None:
+    etag = _etag(version)
+    if etag is not None:
+        response.headers["ETag"] = etag
+
+
+def _not_modified(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match 可為 "*" 或以逗號分隔的多個 ETag，比較時忽略弱驗證前綴 W/
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+@router.post("/properties:batchGet",tags=['properties-management'])
+async def batch_get_properties(
+    request: BatchGetRequest,
+    token = Depends(verify_token)
+) -> List[Optional[Property]]:
+    """
+    get several properties in one round trip
+    
+    Parameters:
+        request: ids of the properties to get (at most 300)
+    
+    Returns:
+        Property: The properties in the requested order,
+        null where the property does not exist or the user has no access
+    
+    Raises:
+        500: Internal unknown error
+    """
+
+    property_handler = PropertyHandler(token['uid'])
+    return await property_handler.get_items(request.ids)
+
+
 @router.get("/properties/{property_id}",tags=['properties-management'])
 async def get_property(
     property_id : str,
+    if_none_match: Optional[str] = Header(None),
     token = Depends(verify_token)
 ) -> Property:
     """
@@ -34,9 +118,11 @@ async def get_property(
     
     Parameters:
         property_id: The ID of the property to get info 
+        If-None-Match: ETag returned by a previous response
     
     Returns:
-        Property: The property look for
+        Property: The property look for, with its version in the ETag header;
+        304 without body when the ETag still matches
     
     Raises:
         400: ID mismatch
@@ -46,13 +132,26 @@ async def get_property(
     """
 
     property_handler = PropertyHandler(token['uid'])
-    return await property_handler.get_item(property_id)
+    item, version = await property_handler.get_item_with_version(property_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail=f"{str(property_id)} is not exist")
+    etag = _etag(version)
+    if etag is None:
+        return item
+    if _not_modified(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(
+        content=property_handler.encode_item(item),
+        media_type="application/json",
+        headers={"ETag": etag}
+    )
     
     
 @router.put("/properties/{property_id}", tags=['properties-management'])
 async def put_property(
     item: Property,
     property_id : str,
+    response: Response,
     token = Depends(verify_token)
 ) -> Property:
     """
@@ -74,7 +173,39 @@ async def put_property(
     if item.id != property_id:
         raise HTTPException(status_code=400, message="Property ID mismatch")
     property_handler = PropertyHandler(token['uid'])
-    return await property_handler.put_item(item)
+    item = await property_handler.put_item(item)
+    _set_etag(response, property_handler.version_of(item))
+    return item
+
+@router.patch("/properties/{property_id}", tags=['properties-management'])
+async def patch_property(
+    changes: Dict[str, Any],
+    property_id : str,
+    response: Response,
+    token = Depends(verify_token)
+) -> Property:
+    """
+    Update only the given fields of a property
+    
+    Parameters:
+        property_id: The ID of the property to update
+        changes: The fields to change and their new values
+    
+    Returns:
+        Property: The updated property
+    
+    Raises:
+        400: Unknown or read-only fields
+        403: Unauthorized access
+        404: Property not found
+        412: Property was modified by someone else meanwhile
+        422: Invalid field values
+        500: Internal unknown error
+    """
+    property_handler = PropertyHandler(token['uid'])
+    item = await property_handler.patch_item(property_id, changes)
+    _set_etag(response, property_handler.version_of(item))
+    return item
 
 @router.post("/properties/{property_id}", tags=['properties-management'])
 async def put_property(
@@ -123,6 +254,78 @@ async def delete_property(
     return await property_handler.delete_item(property_id)
     
     
+@router.post("/properties/{property_id}/rooms:batchWrite",tags=['properties-management'])
+async def batch_write_rooms(
+    request: RoomBatchWriteRequest,
+    property_id : str,
+    token = Depends(verify_token)
+) -> List[BulkWriteResult]:
+    """
+    create or update many rooms of a property at once
+    
+    Parameters:
+        property_id: The ID of the property the rooms belong to
+        request: method ("post" to create, "put" to update) and the rooms (at most 5000)
+    
+    Returns:
+        BulkWriteResult: One result per room in the requested order,
+        ok is false with the error when the batch containing the room failed
+    
+    Raises:
+        400: Property ID mismatch / duplicated room ids
+        403: Unauthorized access
+        404: Property not found
+        500: Internal unknown error
+    """
+    mismatched = [room.id for room in request.items if room.property_id != property_id]
+    if mismatched:
+        raise HTTPException(status_code=400, detail=f"Property ID mismatch: {', '.join(mismatched)}")
+    if await PropertyHandler(token['uid']).get_item(property_id) is None:
+        raise HTTPException(status_code=404, detail=f"{str(property_id)} is not exist")
+    room_handler = RoomHandler(token['uid'])
+    return await room_handler.bulk_save(request.items, request.method)
+
+
+@router.patch("/properties/{property_id}/leases/{lease_id}",tags=['properties-management'])
+async def patch_lease(
+    changes: Dict[str, Any],
+    property_id : str,
+    lease_id : str,
+    response: Response,
+    token = Depends(verify_token)
+) -> Lease:
+    """
+    Update only the given fields of a lease
+    
+    Parameters:
+        property_id: The ID of the property the lease belongs to
+        lease_id: The ID of the lease to update
+        changes: The fields to change and their new values,
+            must include the version the edit is based on
+    
+    Returns:
+        Lease: The updated lease with the version increased
+    
+    Raises:
+        400: Unknown or read-only fields / missing version / property ID mismatch
+        403: Unauthorized access
+        404: Lease not found
+        409: The version is outdated
+        412: Lease was modified by someone else meanwhile
+        422: Invalid field values
+        500: Internal unknown error
+    """
+    if changes.get("property_id", property_id) != property_id:
+        raise HTTPException(status_code=400, detail="Property ID mismatch")
+    lease_handler = LeasesHandler(token['uid'])
+    lease = await lease_handler.get_item(lease_id)
+    if lease is None or lease.property_id != property_id:
+        raise HTTPException(status_code=404, detail=f"{str(lease_id)} is not exist")
+    lease = await lease_handler.patch_item(lease_id, changes)
+    _set_etag(response, lease_handler.version_of(lease))
+    return lease
+
+
 @router.get("/properties/{property_id}/leases",tags=['properties-management'])
 async def get_leases_list(
     property_id : str,
@@ -0,0 +1,95 @@
+'''
+Firestore 存取方式的併發吞吐量比較
+
+以 fake Firestore (每次 RPC 固定延遲) 併發執行 PropertyHandler.get_item，每個請求讀取不同的文件
+(快取未命中，都要做一次 Firestore 讀取)，比較三種 Datastore：
+- blocking: 在 coroutine 中直接呼叫同步 client，RPC 期間阻塞 event loop (改寫前的做法)
+- executor: ExecutorDatastore，同步 client 的 RPC 交給 thread pool
+- async: AsyncDatastore，非同步 client，RPC 期間 event loop 可處理其他請求
+
+執行方式（於 backend 目錄）:
+    python -m benchmarks.async_concurrency
+'''
+from benchmarks import fake_firestore
+
+fake_firestore.install()
+
+from app.config.cache import CacheHandler
+from app.config.datastore import AsyncDatastore, ExecutorDatastore, set_datastore
+from app.models.Property import PropertyHandler
+from typing import Any, Callable
+import asyncio
+import time
+
+RPC_LATENCY = 0.005     # 每次 Firestore RPC 的延遲（秒）
+REQUESTS = 256
+CONCURRENCY = [1, 8, 32, 128]
+READ_WORKERS = 16       # 與 FIRESTORE_READ_WORKERS 預設值相同
+UID = "bench"
+COMPANY = "company"
+
+
+class BlockingDatastore(ExecutorDatastore):
+    '''不經 thread pool，直接在 event loop 上執行同步 client 的 RPC'''
+
+    def __init__(self, client: Any):
+        super().__init__(client, 1, 1)
+
+    async def _run(self, pool_name: str, pool: Any, fn: Callable, *args: Any) -> Any:
+        return fn(*args)
+
+
+def make_collections() -> dict:
+    properties = {
+        f"PROP_{i}": {
+            "id": f"PROP_{i}",
+            "name": f"property {i}",
+            "nickname": f"p{i}",
+            "address": "address",
+            "phone": "0900000000",
+            "owner": "owner",
+            "note": None,
+            "facilities": ["wifi"],
+            "electric_price": 5.5,
+            "electric_month": "單月",
+            "file": [],
+            "access": {"type": "internal", "companies": [COMPANY], "allowClients": None},
+        }
+        for i in range(REQUESTS)
+    }
+    return {"properties": properties, "user": {UID: {"company": COMPANY}}}
+
+
+async def run(datastore: Any, concurrency: int) -> float:
+    set_datastore(datastore)
+    handler = PropertyHandler(UID)
+    CacheHandler().clear(handler.cache_category)
+    await handler.User.get_access()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(item_id: str):
+        async with semaphore:
+            assert await handler.get_item(item_id) is not None
+
+    start = time.perf_counter()
+    await asyncio.gather(*(bounded(f"PROP_{i}") for i in range(REQUESTS)))
+    return REQUESTS / (time.perf_counter() - start)
+
+
+async def main() -> None:
+    collections = make_collections()
+    datastores = {
+        "blocking": BlockingDatastore(fake_firestore.FakeClient(collections, RPC_LATENCY)),
+        "executor": ExecutorDatastore(fake_firestore.FakeClient(collections, RPC_LATENCY), READ_WORKERS, 1),
+        "async": AsyncDatastore(fake_firestore.FakeAsyncClient(collections, RPC_LATENCY)),
+    }
+    print(f"{'in-flight':>10}" + "".join(f" {name + ' req/s':>15}" for name in datastores))
+    for concurrency in CONCURRENCY:
+        rates = [await run(datastore, concurrency) for datastore in datastores.values()]
+        print(f"{concurrency:>10}" + "".join(f" {rate:>15,.0f}" for rate in rates))
+    for datastore in datastores.values():
+        datastore.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+'''
+CacheHandler 讀取競爭測試
+
+在背景持續重填 "tenants" 的同時，以不同執行緒數讀取 "properties"，
+比較舊的單一全域鎖與分類鎖 / 無鎖讀取的讀取吞吐量。
+
+執行方式（於 backend 目錄）:
+    python -m benchmarks.cache_contention
+'''
+from app.config.cache import CacheHandler
+import threading
+import time
+
+DURATION = 1.0
+THREAD_COUNTS = [1, 2, 4, 8]
+PROPERTY_IDS = [f"PROP_{i}" for i in range(500)]
+TENANT_ROWS = [{"id": f"TENA_{i}", "name": "x" * 64, "note": "y" * 256} for i in range(2000)]
+
+
+class GlobalLockCacheHandler:
+    """模擬舊版行為：所有分類共用一把鎖"""
+
+    def __init__(self, handler: CacheHandler):
+        self._handler = handler
+        self._lock = threading.Lock()
+
+    def get(self, category, key):
+        with self._lock:
+            return self._handler.get(category, key)
+
+    def set(self, category, key, value):
+        with self._lock:
+            self._handler.set(category, key, value)
+
+
+def _refill(cache, stop: threading.Event) -> None:
+    while not stop.is_set():
+        for row in TENANT_ROWS:
+            cache.set("tenants", row["id"], row)
+
+
+def _read(cache, stop: threading.Event, counts: list, index: int) -> None:
+    n = 0
+    while not stop.is_set():
+        for key in PROPERTY_IDS:
+            cache.get("properties", key)
+        n += len(PROPERTY_IDS)
+    counts[index] = n
+
+
+def run(cache, threads: int) -> float:
+    stop = threading.Event()
+    counts = [0] * threads
+    writer = threading.Thread(target=_refill, args=(cache, stop))
+    readers = [threading.Thread(target=_read, args=(cache, stop, counts, i)) for i in range(threads)]
+    writer.start()
+    for reader in readers:
+        reader.start()
+    time.sleep(DURATION)
+    stop.set()
+    for reader in readers:
+        reader.join()
+    writer.join()
+    return sum(counts) / DURATION
+
+
+def main() -> None:
+    handler = CacheHandler()
+    for key in PROPERTY_IDS:
+        handler.set("properties", key, {"id": key, "name": key})
+    baseline = GlobalLockCacheHandler(handler)
+
+    print(f"{'threads':>8} {'global lock reads/s':>22} {'per-category reads/s':>22}")
+    for threads in THREAD_COUNTS:
+        print(f"{threads:>8} {run(baseline, threads):>22,.0f} {run(handler, threads):>22,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+'''
+benchmark 用的 fake Firestore client
+
+提供與 google-cloud-firestore 相同介面的同步 client (FakeClient) 與非同步 client (FakeAsyncClient)，
+每次 RPC 固定延遲 latency 秒，讓 benchmark 可以透過真正的 AsyncDatastore / ExecutorDatastore 與 handler 執行。
+只實作 handler 讀取路徑用到的部分：document().get()、list_documents()、where / select / order_by / limit /
+start_after 組成的 query 與 stream()
+
+使用前先呼叫 install()，以 fake 模組取代 app.config.firebase (不讀取 serviceAccountKey.json)，
+之後才 import app 的模組
+'''
+from types import ModuleType, SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+from datetime import datetime, timezone
+import asyncio
+import os
+import sys
+import time
+
+# stream 每批回傳的文件數，同一個 RPC 中不需額外往返
+STREAM_PAGE_SIZE = 300
+
+
+def install() -> None:
+    '''以 fake 模組取代 app.config.firebase，並建立 logger 需要的 Logs 目錄'''
+    os.makedirs("Logs", exist_ok=True)
+    if "app.config.firebase" in sys.modules:
+        return
+    from fastapi.security import HTTPBearer
+    module = ModuleType("app.config.firebase")
+    module.firebase = SimpleNamespace(db=None, async_db=None)
+    module.security = HTTPBearer()
+    module.FirebaseClient = SimpleNamespace
+    sys.modules["app.config.firebase"] = module
+
+
+class FakeSnapshot:
+    def __init__(self, reference: "FakeDocumentReference", data: Optional[dict], update_time: datetime):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.exists = data is not None
+        self.update_time = update_time if data is not None else None
+
+    def to_dict(self) -> Optional[dict]:
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeDocumentReference:
+    def __init__(self, client: "FakeClient", collection_name: str, doc_id: str):
+        self._client = client
+        self._collection_name = collection_name
+        self.id = doc_id
+
+    def _snapshot(self) -> FakeSnapshot:
+        data = self._client.collections[self._collection_name].get(self.id)
+        return FakeSnapshot(self, data, self._client.update_time)
+
+    def get(self) -> FakeSnapshot:
+        self._client.rpc()
+        return self._snapshot()
+
+
+class FakeQuery:
+    def __init__(self, client: "FakeClient", collection_name: str, filters: tuple = (),
+                 fields: Optional[List[str]] = None, order: Optional[str] = None,
+                 after: Optional[dict] = None, limit: Optional[int] = None):
+        self._client = client
+        self._collection_name = collection_name
+        self._filters = filters
+        self._fields = fields
+        self._order = order
+        self._after = after
+        self._limit = limit
+
+    def _copy(self, **changes: Any) -> "FakeQuery":
+        values = dict(filters=self._filters, fields=self._fields, order=self._order,
+                      after=self._after, limit=self._limit)
+        values.update(changes)
+        return self._client.query_class(self._client, self._collection_name, **values)
+
+    def where(self, filter: Any) -> "FakeQuery":
+        return self._copy(filters=self._filters + (filter,))
+
+    def select(self, fields: List[str]) -> "FakeQuery":
+        return self._copy(fields=list(fields))
+
+    def order_by(self, field: str) -> "FakeQuery":
+        return self._copy(order=field)
+
+    def start_after(self, values: dict) -> "FakeQuery":
+        return self._copy(after=values)
+
+    def limit(self, count: int) -> "FakeQuery":
+        return self._copy(limit=count)
+
+    def _matches(self) -> Iterator[FakeSnapshot]:
+        docs = self._client.collections[self._collection_name]
+        ids = sorted(docs) if self._order else list(docs)
+        count = 0
+        for doc_id in ids:
+            data = docs[doc_id]
+            if not all(_match(data, condition) for condition in self._filters):
+                continue
+            if self._after is not None and data[self._order] <= self._after[self._order]:
+                continue
+            if self._limit is not None and count >= self._limit:
+                return
+            count += 1
+            if self._fields is not None:
+                data = _project(data, self._fields)
+            yield FakeSnapshot(FakeDocumentReference(self._client, self._collection_name, doc_id),
+                               data, self._client.update_time)
+
+    def stream(self) -> Iterator[FakeSnapshot]:
+        self._client.rpc()
+        for i, snapshot in enumerate(self._matches()):
+            if i and i % STREAM_PAGE_SIZE == 0:
+                # 下一批資料已在同一個串流中，只計傳輸時間的一小部分
+                self._client.rpc(0.1)
+            yield snapshot
+
+
+class FakeCollectionReference(FakeQuery):
+    def document(self, doc_id: str) -> FakeDocumentReference:
+        return self._client.document_class(self._client, self._collection_name, doc_id)
+
+    def list_documents(self) -> Iterator[FakeDocumentReference]:
+        self._client.rpc()
+        return iter([self.document(doc_id) for doc_id in self._client.collections[self._collection_name]])
+
+
+class FakeClient:
+    '''同步 client，RPC 以 time.sleep 模擬，會阻塞呼叫的執行緒'''
+    document_class = FakeDocumentReference
+    collection_class = FakeCollectionReference
+    query_class = FakeQuery
+
+    def __init__(self, collections: Dict[str, Dict[str, dict]], latency: float):
+        '''
+        Args:
+            collections: collection 名稱 -> {文件id: 文件內容}
+            latency: 每次 RPC 的往返延遲（秒）
+        '''
+        self.collections = collections
+        self.latency = latency
+        self.update_time = datetime.now(timezone.utc)
+        self.rpcs = 0
+
+    def rpc(self, fraction: float = 1.0) -> None:
+        self.rpcs += 1
+        time.sleep(self.latency * fraction)
+
+    def collection(self, name: str) -> FakeCollectionReference:
+        self.collections.setdefault(name, {})
+        return self.collection_class(self, name)
+
+    def get_all(self, doc_refs: List[FakeDocumentReference], field_paths: Optional[List[str]] = None) -> Iterator[FakeSnapshot]:
+        self.rpc()
+        for ref in doc_refs:
+            snapshot = ref._snapshot()
+            if field_paths is not None and snapshot.exists:
+                snapshot._data = _project(snapshot._data, field_paths)
+            yield snapshot
+
+
+class FakeAsyncDocumentReference(FakeDocumentReference):
+    async def get(self) -> FakeSnapshot:
+        await self._client.rpc()
+        return self._snapshot()
+
+
+class FakeAsyncQuery(FakeQuery):
+    async def stream(self):
+        await self._client.rpc()
+        for i, snapshot in enumerate(self._matches()):
+            if i and i % STREAM_PAGE_SIZE == 0:
+                await self._client.rpc(0.1)
+            yield snapshot
+
+
+class FakeAsyncCollectionReference(FakeAsyncQuery):
+    def document(self, doc_id: str) -> FakeDocumentReference:
+        return self._client.document_class(self._client, self._collection_name, doc_id)
+
+    async def list_documents(self):
+        await self._client.rpc()
+        for doc_id in list(self._client.collections[self._collection_name]):
+            yield self.document(doc_id)
+
+
+class FakeAsyncClient(FakeClient):
+    '''非同步 client，RPC 以 asyncio.sleep 模擬，等待期間 event loop 可處理其他請求'''
+    document_class = FakeAsyncDocumentReference
+    collection_class = FakeAsyncCollectionReference
+    query_class = FakeAsyncQuery
+
+    async def rpc(self, fraction: float = 1.0) -> None:
+        self.rpcs += 1
+        await asyncio.sleep(self.latency * fraction)
+
+    async def get_all(self, doc_refs: List[FakeDocumentReference], field_paths: Optional[List[str]] = None):
+        await self.rpc()
+        for ref in doc_refs:
+            snapshot = ref._snapshot()
+            if field_paths is not None and snapshot.exists:
+                snapshot._data = _project(snapshot._data, field_paths)
+            yield snapshot
+
+
+def _value(data: dict, field_path: str) -> Any:
+    for part in field_path.split("."):
+        if not isinstance(data, dict):
+            return None
+        data = data.get(part)
+    return data
+
+
+def _match(data: dict, condition: Any) -> bool:
+    value = _value(data, condition.field_path)
+    if condition.op_string == "array_contains":
+        return isinstance(value, list) and condition.value in value
+    if condition.op_string == "==":
+        return value == condition.value
+    raise NotImplementedError(condition.op_string)
+
+
+def _project(data: dict, fields: List[str]) -> dict:
+    projected = {}
+    for field_path in fields:
+        value = _value(data, field_path)
+        if value is None and "." not in field_path and field_path not in data:
+            continue
+        target = projected
+        *parents, name = field_path.split(".")
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[name] = value
+    return projected
@@ -0,0 +1,106 @@
+'''
+Firestore 文件建立 model 的方式比較
+
+以 10k 筆與 Firestore 讀回時相同形狀的租約文件 (日期為 datetime、access 為 dict、帶 schema 標記)，
+比較完整 pydantic 驗證 (含 parse_date validator) 與 hydrate 的信任模式 (model_construct)。
+model 與 app.models.Leases.Lease 欄位相同，這裡另外定義以免 import Firebase 設定。
+
+執行方式（於 backend 目錄）:
+    python -m benchmarks.hydration
+'''
+from app.models.hydrate import hydrate, SCHEMA_FIELD
+from pydantic import BaseModel, Field, field_validator
+from datetime import date, datetime, timezone
+from typing import List, Optional
+import time
+
+DOCUMENTS = 10000
+ROUNDS = 5
+SCHEMA_VERSION = 1
+
+
+class Access(BaseModel):
+    type: str = Field(..., pattern="^(internal|external)$")
+    companies: List[str]
+    allowClients: Optional[str]
+
+
+class Lease(BaseModel):
+    id : str
+    time_start : date
+    time_end : date
+    time_early : date
+    deposit : int
+    payment_method : str
+    electric : float
+    version : int
+    status : bool
+    note : Optional[str]
+    mini_note : Optional[str]
+    property_id : str
+    tenant_id : str
+    room_id : str
+    file : List
+    access : Access
+
+    @field_validator('time_start', 'time_end', 'time_early')
+    def parse_date(cls, value):
+        if isinstance(value, datetime):
+            return value.date()
+        elif isinstance(value, date):
+            return value
+        raise ValueError('Invalid date format')
+
+
+def make_documents(count: int) -> List[dict]:
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "id": f"LEAS_{i}",
+            "time_start": start,
+            "time_end": start.replace(year=2025),
+            "time_early": start.replace(month=12),
+            "deposit": 20000,
+            "payment_method": "monthly",
+            "electric": 5.5,
+            "version": 1,
+            "status": True,
+            "note": "note " * 10,
+            "mini_note": None,
+            "property_id": f"PROP_{i % 50}",
+            "tenant_id": f"TENA_{i}",
+            "room_id": f"ROOM_{i}",
+            "file": [f"file_{i}.pdf"],
+            "access": {"type": "internal", "companies": ["company"], "allowClients": None},
+            SCHEMA_FIELD: SCHEMA_VERSION,
+        }
+        for i in range(count)
+    ]
+
+
+def measure(documents: List[dict], schema_version: Optional[int]) -> float:
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for data in documents:
+            hydrate(Lease, data, schema_version)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    documents = make_documents(DOCUMENTS)
+    validated = [Lease(**data) for data in documents]
+    trusted = [hydrate(Lease, data, SCHEMA_VERSION) for data in documents]
+    assert [item.model_dump() for item in trusted] == [item.model_dump() for item in validated]
+
+    full = measure(documents, None)
+    fast = measure(documents, SCHEMA_VERSION)
+    print(f"{'mode':>10} {'total (ms)':>11} {'per doc (us)':>13}")
+    print(f"{'validate':>10} {full * 1000:>11.1f} {full / DOCUMENTS * 1e6:>13.2f}")
+    print(f"{'trusted':>10} {fast * 1000:>11.1f} {fast / DOCUMENTS * 1e6:>13.2f}")
+    print(f"speedup: {full / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+'''
+get_item_list 讀取方式比較
+
+以 fake Firestore (每次 RPC 固定往返延遲) 透過真正的 AsyncDatastore 執行 PropertyHandler.get_item_list，
+與舊的 list_documents() + 逐筆 document(id).get() (N+1 次往返) 比較：
+- N+1 get: 在同一個 datastore 上逐筆讀取並驗證，等同改寫前的做法
+- stream (cold): 快取清空後的 get_item_list，單一 query 串流並整批寫入快取
+- cached (warm): 列表快取命中時的 get_item_list
+
+執行方式（於 backend 目錄）:
+    python -m benchmarks.list_fetch
+'''
+from benchmarks import fake_firestore
+
+fake_firestore.install()
+
+from app.config.cache import CacheHandler
+from app.config.datastore import AsyncDatastore, set_datastore
+from app.models.Property import Property, PropertyHandler
+import asyncio
+import time
+
+RPC_LATENCY = 0.0005       # 每次往返的延遲（秒）
+SIZES = [100, 500, 2000]
+ROUNDS = 3                 # stream / cached 取最佳值
+UID = "bench"
+COMPANY = "company"
+
+
+def make_collections(size: int) -> dict:
+    properties = {
+        f"PROP_{i}": {
+            "id": f"PROP_{i}",
+            "name": f"property {i}",
+            "nickname": f"p{i}",
+            "address": "address",
+            "phone": "0900000000",
+            "owner": "owner",
+            "note": None,
+            "facilities": ["wifi"],
+            "electric_price": 5.5,
+            "electric_month": "單月",
+            "file": [],
+            "access": {"type": "internal", "companies": [COMPANY], "allowClients": None},
+        }
+        for i in range(size)
+    }
+    return {"properties": properties, "user": {UID: {"company": COMPANY}}}
+
+
+async def fetch_n_plus_one(handler: PropertyHandler) -> list:
+    collection = handler.store.collection(handler.collection_name)
+    items = []
+    async for doc_ref in collection.list_documents():
+        doc = await handler.store.get(doc_ref)
+        items.append(Property(**doc.to_dict()))
+    return items
+
+
+async def fetch_cold(handler: PropertyHandler) -> list:
+    CacheHandler().clear(handler.cache_category)
+    CacheHandler().clear(handler._list_category)
+    return await handler.get_item_list()
+
+
+async def fetch_warm(handler: PropertyHandler) -> list:
+    return await handler.get_item_list()
+
+
+async def measure(fn, handler: PropertyHandler, size: int, rounds: int = 1) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        items = await fn(handler)
+        best = min(best, time.perf_counter() - start)
+        assert len(items) == size
+    return best
+
+
+async def main() -> None:
+    print(f"{'documents':>10} {'N+1 get (s)':>12} {'stream (s)':>11} {'cached (s)':>11} {'speedup':>8}")
+    for size in SIZES:
+        client = fake_firestore.FakeAsyncClient(make_collections(size), RPC_LATENCY)
+        set_datastore(AsyncDatastore(client))
+        handler = PropertyHandler(UID)
+        await handler.User.get_access()
+        n_plus_one = await measure(fetch_n_plus_one, handler, size)
+        cold = await measure(fetch_cold, handler, size, ROUNDS)
+        warm = await measure(fetch_warm, handler, size, ROUNDS)
+        print(f"{size:>10} {n_plus_one:>12.3f} {cold:>11.4f} {warm:>11.5f} {n_plus_one / cold:>7.0f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
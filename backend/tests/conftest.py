@@ -0,0 +1,22 @@
+'''
+測試共用設定：以 fake 模組取代 app.config.firebase，不需要 serviceAccountKey.json 與網路
+
+執行方式（於 backend 目錄）:
+    python -m pytest tests
+'''
+from types import ModuleType, SimpleNamespace
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+# logger 寫入相對路徑的 Logs/InfoLog.log
+os.makedirs("Logs", exist_ok=True)
+
+if "app.config.firebase" not in sys.modules:
+    from fastapi.security import HTTPBearer
+    firebase_module = ModuleType("app.config.firebase")
+    firebase_module.firebase = SimpleNamespace(db=None, async_db=None)
+    firebase_module.security = HTTPBearer()
+    firebase_module.FirebaseClient = SimpleNamespace
+    sys.modules["app.config.firebase"] = firebase_module
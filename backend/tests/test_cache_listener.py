@@ -0,0 +1,157 @@
+'''
+CacheInvalidationListener.apply_changes 對快取與列表快取的影響
+
+以 fake DocumentChange 模擬 on_snapshot 傳入的 ADDED / MODIFIED / REMOVED 變更
+'''
+from types import SimpleNamespace
+from datetime import datetime, timedelta, timezone
+from app.config.cache import CacheHandler
+from app.config.cache_listener import CacheInvalidationListener
+from app.config.write_behind import write_behind
+from app.models.Property import Property, PropertyHandler
+import asyncio
+import pytest
+
+UPDATE_TIME = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def make_property(item_id: str, name: str = "name", companies=("c",)) -> dict:
+    return {
+        "id": item_id,
+        "name": name,
+        "nickname": "nickname",
+        "address": "address",
+        "phone": "0900000000",
+        "owner": "owner",
+        "note": None,
+        "facilities": [],
+        "electric_price": 5.5,
+        "electric_month": "單月",
+        "file": [],
+        "access": {"type": "internal", "companies": list(companies), "allowClients": None},
+    }
+
+
+def change(kind: str, item_id: str, data: dict = None, update_time: datetime = UPDATE_TIME) -> SimpleNamespace:
+    document = SimpleNamespace(id=item_id, update_time=update_time, to_dict=lambda: data)
+    return SimpleNamespace(type=SimpleNamespace(name=kind), document=document)
+
+
+@pytest.fixture
+def handler():
+    cache = CacheHandler()
+    handler = PropertyHandler("test")
+    cache.clear(handler.cache_category)
+    cache.clear(handler._list_category)
+    yield handler
+    cache.clear(handler.cache_category)
+    cache.clear(handler._list_category)
+
+
+@pytest.fixture
+def listener(handler):
+    return CacheInvalidationListener(None, [handler])
+
+
+def cache_item(handler: PropertyHandler, data: dict) -> None:
+    handler._cache_item(Property(**data), UPDATE_TIME)
+
+
+def cache_list(handler: PropertyHandler, company: str, ids: list) -> None:
+    handler.cache.set(handler._list_category, company, ids, shared=False)
+
+
+def cached(handler: PropertyHandler, item_id: str):
+    entry = handler.cache.peek(handler.cache_category, item_id)
+    return entry.value if entry is not None else None
+
+
+def cached_list(handler: PropertyHandler, company: str):
+    entry = handler.cache.peek(handler._list_category, company)
+    return entry.value if entry is not None else None
+
+
+def test_modified_replaces_cached_item_and_invalidates_list(handler, listener):
+    cache_item(handler, make_property("PROP_1"))
+    cache_list(handler, "c", ["PROP_1"])
+    cache_list(handler, "other", ["PROP_2"])
+
+    later = UPDATE_TIME + timedelta(minutes=1)
+    listener.apply_changes("properties", [change("MODIFIED", "PROP_1", make_property("PROP_1", name="new"), later)])
+
+    assert cached(handler, "PROP_1").name == "new"
+    assert handler.cache.peek(handler.cache_category, "PROP_1").update_time == later.timestamp()
+    assert cached_list(handler, "c") is None
+    assert cached_list(handler, "other") == ["PROP_2"]
+
+
+def test_modified_access_invalidates_old_and_new_company_lists(handler, listener):
+    cache_item(handler, make_property("PROP_1", companies=["c"]))
+    cache_list(handler, "c", ["PROP_1"])
+    cache_list(handler, "d", [])
+
+    listener.apply_changes("properties", [change("MODIFIED", "PROP_1", make_property("PROP_1", companies=["d"]))])
+
+    assert cached(handler, "PROP_1").access.companies == ["d"]
+    assert cached_list(handler, "c") is None
+    assert cached_list(handler, "d") is None
+
+
+def test_removed_deletes_item_and_clears_lists(handler, listener):
+    cache_item(handler, make_property("PROP_1"))
+    cache_list(handler, "c", ["PROP_1"])
+    cache_list(handler, "other", ["PROP_2"])
+
+    listener.apply_changes("properties", [change("REMOVED", "PROP_1")])
+
+    assert cached(handler, "PROP_1") is None
+    # 不知道被刪除的物件屬於哪些公司，所有列表都要失效
+    assert cached_list(handler, "c") is None
+    assert cached_list(handler, "other") is None
+
+
+def test_added_uncached_item_only_invalidates_its_company_list(handler, listener):
+    cache_list(handler, "c", [])
+    cache_list(handler, "other", ["PROP_2"])
+
+    listener.apply_changes("properties", [change("ADDED", "PROP_3", make_property("PROP_3"))])
+
+    assert cached(handler, "PROP_3") is None
+    assert cached_list(handler, "c") is None
+    assert cached_list(handler, "other") == ["PROP_2"]
+
+
+def test_pending_write_behind_keeps_local_value(handler, listener):
+    cache_item(handler, make_property("PROP_1", name="local"))
+    cache_list(handler, "c", ["PROP_1"])
+    write_behind.enqueue(handler.cache_category, handler.collection_name, "PROP_1", make_property("PROP_1", name="local"))
+    try:
+        listener.apply_changes("properties", [change("MODIFIED", "PROP_1", make_property("PROP_1", name="remote"))])
+    finally:
+        asyncio.run(write_behind.discard(handler.collection_name, ["PROP_1"]))
+
+    assert cached(handler, "PROP_1").name == "local"
+    assert cached_list(handler, "c") == ["PROP_1"]
+
+
+def test_invalid_change_evicts_item_and_later_changes_still_apply(handler, listener):
+    cache_item(handler, make_property("PROP_1"))
+    cache_item(handler, make_property("PROP_2"))
+    invalid = make_property("PROP_1")
+    invalid["electric_month"] = "invalid"
+
+    listener.apply_changes("properties", [
+        change("MODIFIED", "PROP_1", invalid),
+        change("MODIFIED", "PROP_2", make_property("PROP_2", name="new")),
+    ])
+
+    assert cached(handler, "PROP_1") is None
+    assert cached(handler, "PROP_2").name == "new"
+
+
+def test_unknown_collection_is_ignored(handler, listener):
+    cache_item(handler, make_property("PROP_1"))
+
+    listener.apply_changes("rooms", [change("REMOVED", "PROP_1")])
+
+    assert cached(handler, "PROP_1") is not None